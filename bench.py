@@ -0,0 +1,208 @@
+#Benchmarks for the game, on fixed seeded workloads
+#Usage: python3 bench.py [--quick] [-o results.json] [--baseline baseline.json] [--update-baseline]
+#Every result is written to the output file as JSON; with a baseline, results that got worse by more than --threshold are flagged and the exit status is 1
+
+import argparse, json, os, sys, time, platform, subprocess, tempfile, itertools
+import starcraft
+from starcraft import Session, RandomPolicy, ScriptedPolicy, Player, Tool, ToolData, Recipe, Content, Screen, GameOver, WeightedList, N_
+
+BENCH_VERSION = 1
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+def best_time(func, repeat):
+    "Returns the fastest of repeat timed calls of func, which is the least disturbed by whatever else the machine is doing"
+    best = float("inf")
+    for i in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def result(value, unit, better):
+    return {"value": value, "unit": unit, "better": better}
+
+def bench_startup(scale, repeat):
+    "Importing the game in a fresh interpreter, and loading the content and a catalog with and without the compiled cache"
+    results = {}
+    def run(code):
+        subprocess.run([sys.executable, "-c", code], cwd=HERE, check=True)
+    interpreter = best_time(lambda: run("pass"), repeat)
+    results["startup.import"] = result(best_time(lambda: run("import starcraft"), repeat) - interpreter, "s", "lower")
+    results["startup.first_turn_ready"] = result(best_time(lambda: run("import starcraft; starcraft.get_content(); starcraft._('Explore')"), repeat) - interpreter, "s", "lower")
+    with tempfile.TemporaryDirectory() as temp:
+        cache_path = os.path.join(temp, "content.pickle")
+        def cold():
+            if os.path.exists(cache_path):
+                os.remove(cache_path)
+            starcraft.load_content(cache_path=cache_path) #JSON parsing, JSONDict conversion and validation, then writing the cache
+        results["startup.content_json"] = result(best_time(cold, repeat), "s", "lower")
+        results["startup.content_cached"] = result(best_time(lambda: starcraft.load_content(cache_path=cache_path), repeat), "s", "lower")
+    results["startup.catalog"] = result(best_time(lambda: starcraft.Catalog(starcraft.DEFAULT_LOCALE), repeat), "s", "lower")
+    return results
+
+def fresh_player(session):
+    session.player = Player()
+    session.game_over = None
+
+def bench_battles(scale, repeat):
+    "random_battle resolved against each mob type in turn, with random answers"
+    results = {}
+    battles = max(1, int(1000 * scale))
+    for mob_type in starcraft.get_content().mob_types:
+        session = Session(RandomPolicy(), quiet=True, seed=1)
+        def fight():
+            for i in range(battles):
+                try:
+                    session.battle(N_("exploring"), mob_type)
+                except GameOver:
+                    fresh_player(session)
+                if session.player.HP < 20: #Keeps every battle starting out the same
+                    session.player.HP = 20
+        elapsed = best_time(fight, repeat)
+        results[f"battle.{mob_type}"] = result(battles / elapsed, "battles/s", "higher")
+    return results
+
+def bench_weighted_list(scale, repeat):
+    "WeightedList.pick and pick_many, on the mob spawn list and on a synthetic list of 1000 entries"
+    results = {}
+    picks = max(1, int(100000 * scale))
+    big = WeightedList()
+    for i in range(1000):
+        big.add(i, i % 17 + 1)
+    for name, weighted in (("mobs", starcraft.get_content().day_mob_types), ("1000", big)):
+        session = Session(RandomPolicy(), quiet=True, seed=2)
+        with session.active():
+            elapsed = best_time(lambda: [weighted.pick() for i in range(picks)], repeat)
+            results[f"pick.{name}"] = result(picks / elapsed, "picks/s", "higher")
+            elapsed = best_time(lambda: weighted.pick_many(picks), repeat)
+            results[f"pick_many.{name}"] = result(picks / elapsed, "picks/s", "higher")
+    return results
+
+def synthetic_content(size):
+    """The real mobs and loot with size made-up recipes, each needing one to three base materials or earlier recipes
+    About a quarter of them only need base materials, so they are craftable from the start"""
+    real = starcraft.get_content()
+    rand = starcraft.random.Random(size)
+    base = ["Wood", "Stone", "Coal", "Raw Iron"]
+    recipes = {}
+    for i in range(size):
+        pool = base if i < 4 or rand.random() < 0.25 else base + [f"Item {j}" for j in rand.sample(range(i), min(i, 3))]
+        components = [[item, rand.randint(1, 4)] for item in rand.sample(pool, rand.randint(1, 3))]
+        recipes[f"Item {i}"] = Recipe(rand.randint(1, 4), components)
+    return Content(dict(real.mob_types), recipes, dict(real.mining_loot), dict(real.explosion_loot))
+
+def bench_craft_menu(scale, repeat):
+    "Showing the Craft menu and answering it, against synthetic recipe sets of 10 to 10000 entries"
+    results = {}
+    real = starcraft.content
+    calls = max(1, int(20 * scale))
+    try:
+        with open(os.devnull, "w") as devnull:
+            for size in (10, 100, 1000, 10000):
+                starcraft.content = synthetic_content(size)
+                session = Session(ScriptedPolicy(itertools.repeat("Item 0")), seed=3, screen=Screen(sink=devnull))
+                with session.active():
+                    for item in ("Wood", "Stone", "Coal", "Raw Iron"):
+                        session.player.add_item(item, 10 ** 6)
+                elapsed = best_time(lambda: [session.craft() for i in range(calls)], repeat)
+                results[f"craft_menu.{size}"] = result(elapsed / calls * 1000, "ms", "lower")
+    finally:
+        starcraft.content = real
+    return results
+
+def bench_mine(scale, repeat):
+    """A long session of nothing but mining with an unbreakable iron pickaxe
+    Reports the mean cost of a Mine action, and how much slower the last stretch was than the first, which should stay near 1"""
+    mines = max(10, int(20000 * scale))
+    chunk = mines // 10
+    session = Session(RandomPolicy(), quiet=True, seed=4)
+    iron = starcraft.get_content().recipes["Iron Pickaxe"].tool_data
+    pickaxe = Tool("Iron Pickaxe", ToolData(iron.damage, 10 ** 9, iron.attack_speed, iron.mining_mult))
+    def arm():
+        fresh_player(session)
+        session.player.add_tool(pickaxe)
+    arm()
+    times = []
+    for i in range(10):
+        start = time.perf_counter()
+        for j in range(chunk):
+            session.player.curr_weapon = pickaxe #Battles can switch weapons
+            try:
+                session.mine()
+            except GameOver:
+                arm()
+        times.append(time.perf_counter() - start)
+    return {
+        "mine.mean": result(sum(times) / mines * 1e6, "us", "lower"),
+        "mine.drift": result(times[-1] / times[0], "ratio", "lower"),
+    }
+
+benchmarks = {
+    "startup": bench_startup,
+    "battle": bench_battles,
+    "pick": bench_weighted_list,
+    "craft_menu": bench_craft_menu,
+    "mine": bench_mine,
+}
+
+def compare(results, baseline, threshold):
+    "Returns the names of the results that got worse than the baseline by more than threshold, printing every comparison"
+    regressions = []
+    for name, new in results.items():
+        old = baseline.get(name)
+        if old is None or old["value"] == 0:
+            continue
+        change = (new["value"] - old["value"]) / old["value"]
+        worse = change > threshold if new["better"] == "lower" else change < -threshold
+        if worse:
+            regressions.append(name)
+        print(f"{name:32} {old['value']:14.6g} -> {new['value']:14.6g} {new['unit']:10} {change:+8.1%}{'  REGRESSION' if worse else ''}")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks the game on fixed seeded workloads")
+    parser.add_argument("-o", "--output", default="bench_results.json", help="file to write the results to (default: %(default)s)")
+    parser.add_argument("--baseline", default="bench_baseline.json", help="results to compare against, if the file exists (default: %(default)s)")
+    parser.add_argument("--update-baseline", action="store_true", help="write the results to the baseline file as well")
+    parser.add_argument("--threshold", type=float, default=0.10, help="how much worse than the baseline counts as a regression (default: %(default)s)")
+    parser.add_argument("--quick", action="store_true", help="run a tenth of the work, for a rough check")
+    parser.add_argument("-r", "--repeat", type=int, default=5, help="runs of each workload, keeping the fastest (default: %(default)s)")
+    parser.add_argument("only", nargs="*", help=f"benchmarks to run, out of {', '.join(benchmarks)} (default: all)")
+    args = parser.parse_args(argv)
+    unknown = [name for name in args.only if name not in benchmarks]
+    if unknown:
+        parser.error(f"unknown benchmark {unknown[0]!r}")
+    scale = 0.1 if args.quick else 1
+    results = {}
+    for name in args.only or benchmarks:
+        start = time.perf_counter()
+        results.update(benchmarks[name](scale, args.repeat))
+        print(f"{name}: {time.perf_counter() - start:.1f}s", file=sys.stderr)
+    report = {
+        "version": BENCH_VERSION,
+        "python": platform.python_version(),
+        "numpy": starcraft.get_numpy() is not None,
+        "quick": args.quick,
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    if args.update_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        return
+    if not os.path.exists(args.baseline):
+        for name, new in results.items():
+            print(f"{name:32} {new['value']:14.6g} {new['unit']}")
+        return
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline.get("quick") != args.quick or baseline.get("numpy") != report["numpy"]:
+        print("warning: the baseline was run with different --quick or NumPy settings", file=sys.stderr)
+    regressions = compare(results, baseline["results"], args.threshold)
+    if regressions:
+        print(f"{len(regressions)} regression(s): {', '.join(regressions)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
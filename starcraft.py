@@ -1,37 +1,298 @@
-import random, json, math, time
-from itertools import accumulate
+import random, json, math, time, sys, contextlib, functools, heapq
+import argparse, os, pickle, hashlib, types, traceback, bisect, atexit
+from array import array
+from collections import Counter
 from enum import Enum
 import gettext
-from termcolor import cprint, colored
+from termcolor import colored
 
 #prepare:
 #set path=%path%;c:\users\antlas\appdata\roaming\python\python311\Scripts\
-#pybabel extract -o lang/messages.pot starcraft.py
+#set pythonpath=.
+#pybabel extract -F babel.cfg -k N_ -o lang/messages.pot .
 #--first time: pybabel init -l ru -i lang/messages.pot -d lang/
 #pybabel update -i lang/messages.pot -l ru -d lang/
 #pybabel compile -d lang/
 
-# initialization
-lang_ru = gettext.translation('messages', localedir='lang', languages=['ru'])
-# set current locale to ru
-lang_ru.install()
+#Everything is loaded on first use, so importing the game is cheap and has no side effects
+DATA_DIR = os.path.dirname(os.path.abspath(__file__))
+LOCALE_DIR = os.path.join(DATA_DIR, "lang")
+
+SOURCE_LOCALE = "en" #The language the message ids are written in, which needs no catalog
+DEFAULT_LOCALE = "ru"
+
+class Catalog:
+    "The translations for one locale, read from lang/<locale>/LC_MESSAGES/messages.mo; each message goes through gettext only once"
+
+    def __init__(self, locale):
+        self.locale = locale
+        self.translation = gettext.translation('messages', localedir=LOCALE_DIR, languages=[locale], fallback=locale == SOURCE_LOCALE)
+        self.strings = {} #Every message id already looked up, with its translation
+        self.reverses = {} #id of a collection of message ids -> (the collection, its reverse map), for reverse
+
+    def gettext(self, message):
+        try:
+            return self.strings[message]
+        except KeyError:
+            text = self.strings[message] = self.translation.gettext(message)
+            return text
+
+    def reverse(self, messages):
+        """Returns a dict from the translation of each of messages back to its id, built only once for a given collection
+        The collection mustn't change afterwards, which holds for the content's recipes"""
+        entry = self.reverses.get(id(messages))
+        if entry is None or entry[0] is not messages:
+            entry = self.reverses[id(messages)] = (messages, {self.gettext(message): message for message in messages})
+        return entry[1]
+
+catalogs = {} #Loaded on first use and shared by every session speaking that locale
+
+def get_catalog(locale=None):
+    locale = locale or DEFAULT_LOCALE
+    try:
+        return catalogs[locale]
+    except KeyError:
+        catalog = catalogs[locale] = Catalog(locale)
+        return catalog
+
+def available_locales():
+    "Returns the locales there are catalogs for, plus the source language"
+    try:
+        found = [name for name in os.listdir(LOCALE_DIR) if os.path.exists(os.path.join(LOCALE_DIR, name, "LC_MESSAGES", "messages.mo"))]
+    except FileNotFoundError:
+        found = []
+    return sorted(set(found) | {SOURCE_LOCALE})
+
+catalog = None #What _() translates with; each session swaps in its own while it runs
+
+def _(message):
+    return (catalog or get_catalog()).gettext(message)
+
+def N_(message):
+    "Marks a message id for pybabel without translating it; the game logic works with ids and only translates them for display"
+    return message
+
+@functools.lru_cache(maxsize=None)
+def get_numpy():
+    "Returns the numpy module, or None if it isn't installed; imported on first use, since that takes longer than importing the rest of the game"
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
 
             
 #A text-based RPG game based on Minecraft
 
+class RNG:
+    """A seedable source of random numbers that hands out uniform floats from a prefetched block
+    With NumPy, blocks come from a PCG64 Generator, which is also exposed as .generator for vectorized draws"""
+    
+    def __init__(self, seed=None, block_size=512):
+        self.block_size = block_size
+        self.seed(seed)
+        
+    def seed(self, seed=None):
+        self.initial_seed = seed
+        self.bit_generator = None
+        self.buffer = array("d")
+        self.refills = 0
+        self.direct_draws = 0 #Numbers the vectorized draws took straight from the generator, counted by them
+        
+    @property
+    def generator(self):
+        #Made on first use, since the first NumPy Generator in a process takes a while to set up
+        if self.bit_generator is None:
+            seed = self.initial_seed
+            numpy = get_numpy()
+            if numpy is not None:
+                self.seed_sequence = seed if isinstance(seed, numpy.random.SeedSequence) else numpy.random.SeedSequence(seed)
+                self.bit_generator = numpy.random.Generator(numpy.random.PCG64(self.seed_sequence))
+            else:
+                self.bit_generator = random.Random(seed)
+        return self.bit_generator
+        
+    def spawn(self, n):
+        "Returns n new RNGs whose streams are independent of this one and of each other"
+        generator = self.generator
+        if get_numpy() is not None:
+            return [RNG(child, self.block_size) for child in self.seed_sequence.spawn(n)]
+        return [RNG(generator.getrandbits(128), self.block_size) for i in range(n)]
+        
+    def refill(self):
+        self.refills += 1
+        if get_numpy() is not None:
+            self.buffer.frombytes(self.generator.random(self.block_size).tobytes())
+        else:
+            r = self.generator.random
+            self.buffer.extend(r() for i in range(self.block_size))
+        
+    def draws(self):
+        "Returns how many numbers have been drawn so far, counted from the refills so that drawing costs nothing extra"
+        return self.refills * self.block_size - len(self.buffer) + self.direct_draws
+        
+    def random(self):
+        "Returns a float in [0, 1)"
+        try:
+            return self.buffer.pop()
+        except IndexError:
+            self.refill()
+            return self.buffer.pop()
+    
+    def randint(self, a, b):
+        "Returns an int between a and b, inclusive"
+        return a + int(self.random() * (b - a + 1))
+        
+    def uniform(self, a, b):
+        return a + (b - a) * self.random()
+        
+    def choice(self, seq):
+        return seq[int(self.random() * len(seq))]
+        
+    def weighted_choice(self, choices, weights):
+        r = self.random() * sum(weights)
+        for choice, weight in zip(choices, weights):
+            r -= weight
+            if r < 0:
+                return choice
+        return choices[-1]
+
+#Every random decision in the game goes through this; a Session swaps in its own while it runs
+rng = RNG()
+
+@functools.lru_cache(maxsize=1024)
+def cached_colored(text, color, attrs):
+    return colored(text, color, attrs=attrs)
+
+class Screen:
+    """Collects the game's text and writes it to its sink in one go when flushed, rather than a write per line
+    The sink is any object with write and flush (stdout if not given); colors are left out unless color is set"""
+    
+    enabled = True
+    
+    def __init__(self, sink=None, color=False, buffered=True):
+        self.sink = sink
+        self.color = color
+        self.buffered = buffered
+        self.parts = []
+        
+    def print(self, *values, sep=" ", end="\n"):
+        self.parts.append(sep.join(map(str, values)) + end)
+        if not self.buffered:
+            self.flush()
+        
+    def cprint(self, text, color=None, attrs=None):
+        self.print(self.colored(text, color, attrs))
+        
+    def colored(self, text, color=None, attrs=None):
+        if not self.color:
+            return text
+        return cached_colored(text, color, tuple(attrs) if attrs else None)
+        
+    def take(self):
+        "Returns everything written since the last flush, and forgets it"
+        text = "".join(self.parts)
+        self.parts.clear()
+        return text
+        
+    def flush(self):
+        if self.parts:
+            sink = self.sink or sys.stdout
+            sink.write(self.take())
+            sink.flush()
+
+class NullScreen:
+    """A Screen that drops everything, for headless sessions
+    The busiest messages check enabled first, so headless games don't even translate and format them"""
+    
+    color = False
+    enabled = False
+    
+    def print(self, *values, sep=" ", end="\n"):
+        pass
+        
+    def cprint(self, text, color=None, attrs=None):
+        pass
+        
+    def colored(self, text, color=None, attrs=None):
+        return text
+        
+    def take(self):
+        return ""
+        
+    def flush(self):
+        pass
+
+#All of the game's text goes through this; a Session swaps in its own while it runs, and outside of one it goes straight to stdout
+screen = Screen(color=True, buffered=False)
+
 def one_in(x):
     "Returns True with a probability of 1/x, otherwise returns False"
-    return x <= 1 or random.randint(1, x) == 1
+    return x <= 1 or rng.random() * x < 1
 
 def x_in_y(x, y):
     "Returns True with a probability of x/y, otherwise returns False"
-    return random.uniform(0, y) < x
+    return rng.random() * y < x
     
 def binomial(num, x, y=100):
-    if x == 1 and isinstance(y, int):
-        return sum(1 for i in range(num) if one_in(y))
-    else:
-        return sum(1 for i in range(num) if x_in_y(x, y))
+    """Returns how many of num trials succeed, each with a probability of x/y
+    Costs about the same no matter how large num is"""
+    p = 1 if x == 1 and y <= 1 else x / y #Matches one_in(y) and x_in_y(x, y)
+    if num <= 0 or p <= 0:
+        return 0
+    if p >= 1:
+        return num
+    if p > 0.5:
+        return num - binomial_p(num, 1 - p)
+    return binomial_p(num, p)
+
+def binomial_p(n, p):
+    "Samples from the binomial distribution with n trials and 0 < p <= 0.5"
+    q = 1 - p
+    if n * p < 10:
+        #Inversion: walk up the CDF from 0, which takes about n*p steps
+        s = p / q
+        a = (n + 1) * s
+        r = q ** n
+        u = rng.random()
+        k = 0
+        while u > r and k < n:
+            u -= r
+            k += 1
+            r *= a / k - s
+        return k
+    #BTRS, the transformed rejection with squeeze method from Hormann (1993), "The generation of binomial random variates"
+    spq = math.sqrt(n * p * q)
+    b = 1.15 + 2.53 * spq
+    a = -0.0873 + 0.0248 * b + 0.01 * p
+    c = n * p + 0.5
+    vr = 0.92 - 4.2 / b
+    alpha = (2.83 + 5.1 / b) * spq
+    lpq = math.log(p / q)
+    m = math.floor((n + 1) * p) #Mode of the distribution
+    h = math.lgamma(m + 1) + math.lgamma(n - m + 1)
+    while True:
+        u = rng.random() - 0.5
+        us = 0.5 - abs(u)
+        k = math.floor((2 * a / us + b) * u + c)
+        if k < 0 or k > n:
+            continue
+        v = rng.random()
+        if us >= 0.07 and v <= vr: #Squeeze: accept without evaluating the densities
+            return k
+        v *= alpha / (a / (us * us) + b)
+        if math.log(v) <= h - math.lgamma(k + 1) - math.lgamma(n - k + 1) + (k - m) * lpq:
+            return k
+
+def binomial_many(nums, x, y=100):
+    "Like binomial, but for a whole sequence of trial counts at once; returns a list"
+    numpy = get_numpy()
+    if numpy is None:
+        return [binomial(num, x, y) for num in nums]
+    p = 1 if x == 1 and y <= 1 else min(max(x / y, 0), 1)
+    gen = rng.generator
+    rng.direct_draws += len(nums)
+    return gen.binomial(numpy.maximum(numpy.asarray(nums), 0), p).tolist()
 
 def round_stochastic(value):
     """Randomly rounds a number up or down, based on its decimal part
@@ -40,11 +301,11 @@ def round_stochastic(value):
     low = math.floor(value)
     high = math.ceil(value)
     if value < 0:
-        if random.random() < high - value:
+        if rng.random() < high - value:
             return low
         return high
     else:
-        if random.random() < value - low:
+        if rng.random() < value - low:
             return high
         return low 
 
@@ -64,6 +325,149 @@ def yes_no(message):
     m = input(message + _(" (Y/N) "))
     return len(m) > 0 and m[0].lower() == _("y")
 
+#The game logic never reads input itself: it yields one of these prompts and gets the answer back from whoever drives it
+class Choice:
+    """choices are message ids, shown translated unless labels are given
+    The answer is the number of the choice, or its id with return_text"""
+
+    def __init__(self, *choices, return_text=False, labels=None):
+        self.choices = choices
+        self.return_text = return_text
+        self.choice_labels = labels
+
+    def labels(self):
+        if self.choice_labels is None:
+            self.choice_labels = [_(choice) for choice in self.choices]
+        return self.choice_labels
+
+    def ask(self, policy):
+        choice = policy.choose(self)
+        return self.choices[choice - 1] if self.return_text else choice
+
+    #render and parse are for answering prompts a line at a time, e.g. over a network connection
+    reprompt = ">> "
+
+    def render(self):
+        return "".join(f"{index + 1}. {label}\n" for index, label in enumerate(self.labels())) + ">> "
+
+    def parse(self, line):
+        "Returns the answer for a line of input, or None if it isn't a valid one"
+        try:
+            choice = int(line)
+        except ValueError:
+            return None
+        if 1 <= choice <= len(self.choices):
+            return self.choices[choice - 1] if self.return_text else choice
+        return None
+
+class YesNo:
+
+    def __init__(self, message):
+        self.message = message
+
+    def ask(self, policy):
+        return policy.yes_no(self)
+
+    def render(self):
+        return _(self.message) + _(" (Y/N) ")
+
+    def parse(self, line):
+        return len(line) > 0 and line[0].lower() == _("y")
+
+class TextInput:
+
+    def __init__(self, suggestions=()):
+        self.suggestions = suggestions
+
+    def ask(self, policy):
+        return policy.text(self)
+
+    def render(self):
+        return ""
+
+    def parse(self, line):
+        return line
+
+class TerminalPolicy:
+    "Asks the person at the keyboard"
+
+    def choose(self, prompt):
+        return choice_input(*prompt.labels())
+
+    def yes_no(self, prompt):
+        return yes_no(_(prompt.message))
+
+    def text(self, prompt):
+        return input()
+
+class RandomPolicy:
+    "Picks uniformly among the available answers"
+
+    def __init__(self, rand=None):
+        self.rand = rand #Defaults to the running session's RNG
+
+    def choose(self, prompt):
+        return (self.rand or rng).randint(1, len(prompt.choices))
+
+    def yes_no(self, prompt):
+        return (self.rand or rng).random() < 0.5
+
+    def text(self, prompt):
+        suggestions = prompt.suggestions
+        return (self.rand or rng).choice(suggestions) if suggestions else ""
+
+class ScriptedPolicy:
+    "Gives a fixed sequence of answers, for driving the game from code"
+
+    def __init__(self, answers):
+        self.answers = iter(answers)
+
+    def next_answer(self):
+        try:
+            return next(self.answers)
+        except StopIteration:
+            raise EOFError("scripted policy ran out of answers") from None #Just like input() at the end of its input
+
+    def choose(self, prompt):
+        answer = self.next_answer() #Either the number of the choice or its id
+        return prompt.choices.index(answer) + 1 if isinstance(answer, str) else answer
+
+    def yes_no(self, prompt):
+        return bool(self.next_answer())
+
+    def text(self, prompt):
+        return self.next_answer()
+
+class RecordingPolicy:
+    "Passes every prompt on to another policy, keeping a log of the answers so the game can be replayed"
+
+    def __init__(self, policy):
+        self.policy = policy
+        self.answers = []
+
+    def choose(self, prompt):
+        answer = self.policy.choose(prompt)
+        self.answers.append(answer)
+        return answer
+
+    def yes_no(self, prompt):
+        answer = self.policy.yes_no(prompt)
+        self.answers.append(answer)
+        return answer
+
+    def text(self, prompt):
+        answer = self.policy.text(prompt)
+        self.answers.append(answer)
+        return answer
+
+class GameOver(Exception):
+    "Raised when the player dies"
+
+    def __init__(self, death_reason=None, killer=None):
+        super().__init__(death_reason)
+        self.death_reason = death_reason
+        self.killer = killer
+
 class JSONDict(dict):
     
     def __init__(self, d={}):
@@ -112,31 +516,206 @@ class MobBehaviorType(Enum):
     hostile = 2 #Hostile; 50% chance to attack immediately when encountered
 
 class WeightedList:
+    "Weighted random choice in O(1) per pick, using Vose's alias method"
     
     def __init__(self):
         self.choices = []
         self.weights = []
-        self.cumulative_weights = None
+        self.alias_table = None
+        self.alias_arrays = None
         
     def add(self, value, weight):
         if weight > 0:
             self.choices.append(value)
             self.weights.append(weight)
-            self.cumulative_weights = None 
+            self.alias_table = None 
     
     def clear(self):
         self.choices.clear()
         self.weights.clear()
-        self.cumulative_weights = None 
+        self.alias_table = None 
+        
+    def build_alias_table(self):
+        """Splits the weights into n equal columns, each holding at most two choices:
+        column i picks choices[i] with probability prob[i], otherwise choices[alias[i]]"""
+        n = len(self.weights)
+        total = sum(self.weights)
+        prob = [weight * n / total for weight in self.weights]
+        alias = list(range(n))
+        small = [i for i in range(n) if prob[i] < 1]
+        large = [i for i in range(n) if prob[i] >= 1]
+        while small and large:
+            less = small.pop()
+            more = large.pop()
+            alias[less] = more
+            prob[more] += prob[less] - 1
+            if prob[more] < 1:
+                small.append(more)
+            else:
+                large.append(more)
+        for i in small + large: #Whatever is left over is 1 up to floating point error
+            prob[i] = 1
+        self.alias_table = (prob, alias)
+        numpy = get_numpy()
+        if numpy is not None:
+            self.alias_arrays = (numpy.array(prob), numpy.array(alias))
         
     def pick(self):
         if len(self.choices) == 0:
             raise IndexError("cannot pick from an empty weighted list")
-        if not self.cumulative_weights:
-            self.cumulative_weights = list(accumulate(self.weights))
-        return random.choices(self.choices, cum_weights=self.cumulative_weights)[0]
+        if self.alias_table is None:
+            self.build_alias_table()
+        prob, alias = self.alias_table
+        r = rng.random() * len(prob)
+        i = int(r)
+        return self.choices[i] if r - i < prob[i] else self.choices[alias[i]]
+    
+    def pick_many(self, k):
+        "Returns a list of k independent picks"
+        if len(self.choices) == 0:
+            raise IndexError("cannot pick from an empty weighted list")
+        if self.alias_table is None:
+            self.build_alias_table()
+        numpy = get_numpy()
+        if numpy is None or k < 64: #Below this, setting up the arrays costs more than it saves
+            return [self.pick() for i in range(k)]
+        prob, alias = self.alias_arrays
+        gen = rng.generator
+        rng.direct_draws += k
+        r = gen.random(k) * len(prob)
+        i = r.astype(numpy.intp)
+        i = numpy.where(r - i < prob[i], i, alias[i])
+        choices = self.choices
+        return [choices[j] for j in i.tolist()]
 
-mobs_dict = json.load(open("mobs.json"))
+class DropTable:
+    """A mob's death_drops compiled into parallel arrays, one slot per entry:
+    the items it picks from, the quantity range and the chance as x/y"""
+    
+    def __init__(self, death_drops):
+        self.items = []
+        self.min_quantity = []
+        self.max_quantity = []
+        self.chance_x = []
+        self.chance_y = []
+        for drop in death_drops:
+            item = drop["item"]
+            q = drop.get("quantity", 1)
+            x, y = drop.get("chance", [1, 1])
+            self.items.append(tuple(item) if isinstance(item, list) else (item,))
+            self.min_quantity.append(q[0] if isinstance(q, list) else q)
+            self.max_quantity.append(q[1] if isinstance(q, list) else q)
+            self.chance_x.append(x)
+            self.chance_y.append(y)
+        self.arrays = None
+        
+    def __len__(self):
+        return len(self.items)
+        
+    def roll(self):
+        "Rolls the drops for one kill; returns a dict of item -> amount"
+        got = {}
+        for items, low, high, x, y in zip(self.items, self.min_quantity, self.max_quantity, self.chance_x, self.chance_y):
+            item = items[0] if len(items) == 1 else rng.choice(items)
+            amount = low if low == high else rng.randint(low, high)
+            if amount > 0 and x_in_y(x, y):
+                got[item] = got.get(item, 0) + amount
+        return got
+        
+    def build_arrays(self):
+        #Every possible item of every entry gets its own output column, so one bincount adds up all the drops
+        numpy = get_numpy()
+        offsets = []
+        columns = []
+        for items in self.items:
+            offsets.append(len(columns))
+            columns.extend(items)
+        self.arrays = (
+            numpy.array(offsets),
+            numpy.array([len(items) for items in self.items]),
+            numpy.array(self.min_quantity),
+            numpy.array(self.max_quantity),
+            numpy.array(self.chance_x, dtype=float),
+            numpy.array(self.chance_y, dtype=float),
+            columns
+        )
+        
+    def roll_many(self, kills):
+        "Rolls the drops for many kills at once; returns a Counter of the total amount of each item"
+        total = Counter()
+        if kills <= 0 or not self.items:
+            return total
+        numpy = get_numpy()
+        if numpy is None:
+            for i in range(kills):
+                total.update(self.roll())
+            return total
+        if self.arrays is None:
+            self.build_arrays()
+        offsets, counts, low, high, x, y, columns = self.arrays
+        gen = rng.generator
+        shape = (kills, len(self.items))
+        rng.direct_draws += 3 * kills * len(self.items)
+        amounts = low + (gen.random(shape) * (high - low + 1)).astype(numpy.int64)
+        amounts[gen.random(shape) * y >= x] = 0
+        picked = offsets + (gen.random(shape) * counts).astype(numpy.int64)
+        sums = numpy.bincount(picked.ravel(), weights=amounts.ravel(), minlength=len(columns))
+        for item, amount in zip(columns, sums.tolist()):
+            if amount > 0:
+                total[item] += int(amount)
+        return total
+
+class LootTable:
+    """Items found by one action, such as mining with a given pickaxe, each with a weight, a quantity range and an EXP range
+    Built once from loot.json with its alias table ready, and never changed afterwards, so it can be shared by every game"""
+    
+    def __init__(self, entries):
+        self.entries = tuple(entries) #(item, weight, min quantity, max quantity, min EXP, max EXP)
+        self.items = WeightedList()
+        for item, weight, *ranges in self.entries:
+            self.items.add(item, weight)
+        self.items.choices = tuple(self.items.choices)
+        self.items.weights = tuple(self.items.weights)
+        self.items.build_alias_table()
+        self.ranges = {item: ranges for item, weight, *ranges in self.entries}
+        
+    def pick(self):
+        return self.items.pick()
+        
+    def pick_many(self, k):
+        return self.items.pick_many(k)
+        
+    def roll_quantity(self, item):
+        low, high = self.ranges[item][:2]
+        return low if low == high else rng.randint(low, high)
+        
+    def roll_exp(self, item):
+        low, high = self.ranges[item][2:]
+        return low if low == high else rng.randint(low, high)
+        
+    @staticmethod
+    def from_list(entries):
+        if not isinstance(entries, list) or not entries:
+            raise JSONError("A loot table must be a non-empty list", entries)
+        table = []
+        for entry in entries:
+            if not isinstance(entry, dict):
+                raise JSONError("Each entry in a loot table must be a dict", entry)
+            entry = JSONDict(entry)
+            item = entry.gettype("item", str)
+            weight = entry.gettype("weight", int)
+            if weight <= 0:
+                raise JSONError("weight must be positive", entry)
+            ranges = []
+            for key, default in (("quantity", 1), ("exp", 0)):
+                value = entry.gettype_or_default(key, (int, list), default)
+                if isinstance(value, int):
+                    value = [value, value]
+                if len(value) != 2 or not all(isinstance(n, int) for n in value) or not 0 <= value[0] <= value[1]:
+                    raise JSONError(f"{key} must be an int or a 2-item list going from low to high", entry)
+                ranges.extend(value)
+            table.append((item, weight, *ranges))
+        return LootTable(table)
 
 class MobType:
     
@@ -146,6 +725,7 @@ class MobType:
         self.hp = max_hp
         self.behavior = behavior
         self.death_drops = death_drops
+        self.drop_table = DropTable(death_drops)
         self.attack_strength = attack_strength
         self.spawns_naturally = True
     
@@ -180,67 +760,71 @@ class MobType:
                 raise JSONError("quantity muat be an int or a 2-item list", drop)   
         return MobType(name, weight, HP, behavior, death_drops, attack_strength, spawns_naturally)
 
-mob_types = {}
-
-for mob_dict in mobs_dict:
-    name = mob_dict["name"]
-    mob_types[name] = MobType.from_dict(mob_dict)   
-
-#passive_mob_types = list(filter(lambda typ: mob_types[typ].behavior == MobBehaviorType.passive, mob_types))
-#night_mob_types = list(filter(lambda typ: mob_types[typ].night_mob, mob_types))
-day_mob_types = WeightedList()
-#night_mob_types = WeightedList()
-for typ in mob_types:
-    mob_type = mob_types[typ]
-    if mob_type.spawns_naturally:
-        #if mob_type.night_mob:
-        #   night_mob_types.add(typ, mob_type.weight)
-        #else:
-        day_mob_types.add(typ, mob_type.weight)
-
 class Mob:
+    "A mob being fought: only its HP is its own, everything else comes from its shared MobType"
+    __slots__ = ("type", "HP")
+    pool = None #Released mobs kept for reuse, once pooling is turned on with enable_pool
     
-    def __init__(self, name, HP, behavior: MobBehaviorType, death_drops, attack_strength):
-        self.name = name
-        self.HP = HP
-        self.behavior = behavior
-        self.death_drops = death_drops
-        self.attack_strength = attack_strength
+    def __init__(self, mob_type):
+        self.type = mob_type
+        self.HP = mob_type.hp
+        
+    @property
+    def name(self):
+        return self.type.name
+        
+    @property
+    def behavior(self):
+        return self.type.behavior
+        
+    @property
+    def drop_table(self):
+        return self.type.drop_table
+        
+    @property
+    def attack_strength(self):
+        return self.type.attack_strength
         
     @staticmethod
     def new_mob(typ: str):
-        typ = mob_types[typ]
-        return Mob(typ.name, typ.hp, typ.behavior, typ.death_drops, typ.attack_strength)
+        typ = get_content().mob_types[typ]
+        pool = Mob.pool
+        if pool:
+            mob = pool.pop()
+            mob.type = typ
+            mob.HP = typ.hp
+            return mob
+        return Mob(typ)
+        
+    @staticmethod
+    def enable_pool():
+        "Makes released mobs get reused by new_mob, which saves an allocation per battle in long simulations"
+        if Mob.pool is None:
+            Mob.pool = []
+        
+    def release(self):
+        "Hands the mob back for reuse once its battle is over; it must not be used after this"
+        if Mob.pool is not None and len(Mob.pool) < 64:
+            Mob.pool.append(self)
     
     def damage(self, amount, player):
         self.HP -= amount
         if self.HP <= 0:
-            print(_("The {0} is dead!").format(self.name.lower()))
+            if screen.enabled:
+                screen.print(_("The {0} is dead!").format(self.name.lower()))
             self.on_death(player)
             
     def on_death(self, player):
-        if self.death_drops:
-            got = {}
-            for drop in self.death_drops:
-                item = drop["item"]
-                if isinstance(item, list):
-                    item = random.choice(item)
-                q = drop.get("quantity", 1)
-                x, y = drop.get("chance", [1, 1])
-                assert isinstance(q, (list, int))   
-                if isinstance(q, list):
-                    amount = random.randint(*q)
-                elif isinstance(q, int):
-                    amount = q
-                if amount > 0 and x_in_y(x, y):
-                    if item == "EXP":
-                        player.gain_exp(amount)
-                    else:
-                        got[item] = amount
+        if self.drop_table:
+            got = self.drop_table.roll()
+            if "EXP" in got:
+                player.gain_exp(got.pop("EXP"))
             if got:
-                print("You got: ")
+                if screen.enabled:
+                    screen.print(_("You got: "))
                 for item in got:
-                    print(f"{got[item]}x {item}")
+                    if screen.enabled:
+                        screen.print(f"{got[item]}x {_(item)}")
                     player.add_item(item, got[item])
 
 class ToolData:
@@ -266,6 +850,7 @@ class Recipe:
         self.quantity = quantity
         self.components = components
         self.tool_data = tool_data
+        self.component_ids = () #The components again, by item id, filled in by Content
     
     @json_dict  
     @staticmethod
@@ -277,47 +862,320 @@ class Recipe:
             tool_data = ToolData.from_dict(tool_data)
         return Recipe(quantity, components, tool_data)
         
-r = json.load(open("recipes.json"))
-recipes = {}
-for name in r:
-    recipe = r[name]
-    recipes[name] = Recipe.from_dict(recipe)
+CONTENT_FILES = (os.path.join(DATA_DIR, "mobs.json"), os.path.join(DATA_DIR, "recipes.json"), os.path.join(DATA_DIR, "loot.json"))
+CONTENT_CACHE = os.path.join(DATA_DIR, "__pycache__", "content.pickle")
+CONTENT_CACHE_VERSION = 2 #Bump whenever Content.compile changes
+
+class Content:
+    "The mobs, recipes and loot tables from the data files, validated and ready to use"
+    
+    builtin_items = (N_("Grass"), N_("Dirt"), N_("Wood"), N_("Egg")) #Items the game code gives out itself, not named in any data file
+    
+    def __init__(self, mob_types, recipes, mining_loot, explosion_loot):
+        self.mob_types = mob_types
+        self.recipes = recipes
+        self.mining_loot = mining_loot #By the name of the pickaxe mined with
+        self.explosion_loot = explosion_loot #By what the player was doing when the creeper exploded
+        #Every item gets a dense integer id, so an inventory can be an array of counts
+        self.item_ids = {}
+        self.item_names = []
+        def register(item):
+            if item not in self.item_ids:
+                self.item_ids[item] = len(self.item_names)
+                self.item_names.append(item)
+        for item in self.builtin_items:
+            register(item)
+        for name, recipe in recipes.items():
+            register(name)
+            for component, amount in recipe.components:
+                register(component)
+        for mob_type in mob_types.values():
+            for items in mob_type.drop_table.items:
+                for item in items:
+                    if item != "EXP":
+                        register(item)
+        for table in list(mining_loot.values()) + list(explosion_loot.values()):
+            for item in table.items.choices:
+                register(item)
+        for recipe in recipes.values():
+            recipe.component_ids = tuple((self.item_ids[component], amount) for component, amount in recipe.components)
+        #passive_mob_types = list(filter(lambda typ: mob_types[typ].behavior == MobBehaviorType.passive, mob_types))
+        #night_mob_types = list(filter(lambda typ: mob_types[typ].night_mob, mob_types))
+        self.day_mob_types = WeightedList()
+        #night_mob_types = WeightedList()
+        for typ in mob_types:
+            mob_type = mob_types[typ]
+            if mob_type.spawns_naturally:
+                #if mob_type.night_mob:
+                #   night_mob_types.add(typ, mob_type.weight)
+                #else:
+                self.day_mob_types.add(typ, mob_type.weight)
+        self.day_mob_types.build_alias_table()
+        #Which recipes each item is a component of, so a change to one item only rechecks the recipes that use it
+        self.recipe_order = {name: index for index, name in enumerate(recipes)}
+        self.recipes_using = {}
+        self.recipes_without_components = []
+        for name in recipes:
+            components = recipes[name].components
+            if not components:
+                self.recipes_without_components.append(name)
+            for component, amount in components:
+                self.recipes_using.setdefault(component, []).append(name)
+        self.crafting_chains = {}
+        
+    def crafting_chain(self, item):
+        """Returns the names of the recipes that go into making item, including itself, ordered so every recipe comes before the ones making its components
+        Each item's chain is worked out once and then reused"""
+        if item not in self.recipes:
+            return ()
+        chain = self.crafting_chains.get(item)
+        if chain is None:
+            order = []
+            visited = set()
+            def visit(name):
+                if name in visited or name not in self.recipes:
+                    return #Already placed, a raw material, or a cycle back to a recipe we are still expanding
+                visited.add(name)
+                for component, amount in self.recipes[name].components:
+                    visit(component)
+                order.append(name)
+            visit(item)
+            chain = self.crafting_chains[item] = tuple(reversed(order))
+        return chain
+    
+    def freeze(self):
+        """Does every bit of lazy setup now and swaps the containers for immutable ones
+        Meant for a parent process about to fork: workers then only ever read the content, so its memory pages stay shared"""
+        for name in self.recipes:
+            self.crafting_chain(name)
+            recipe = self.recipes[name]
+            recipe.components = tuple(tuple(component) for component in recipe.components)
+        for mob_type in self.mob_types.values():
+            drop_table = mob_type.drop_table
+            if get_numpy() is not None and drop_table.items and drop_table.arrays is None:
+                drop_table.build_arrays()
+        self.mob_types = types.MappingProxyType(self.mob_types)
+        self.recipes = types.MappingProxyType(self.recipes)
+        self.recipe_order = types.MappingProxyType(self.recipe_order)
+        self.recipes_using = types.MappingProxyType({item: tuple(names) for item, names in self.recipes_using.items()})
+        self.recipes_without_components = tuple(self.recipes_without_components)
+        self.crafting_chains = types.MappingProxyType(self.crafting_chains)
+        self.mining_loot = types.MappingProxyType(self.mining_loot)
+        self.explosion_loot = types.MappingProxyType(self.explosion_loot)
+        self.item_ids = types.MappingProxyType(self.item_ids)
+        self.item_names = tuple(self.item_names)
+    
+    @staticmethod
+    def from_json(mobs_dict, recipes_dict, loot_dict):
+        mob_types = {}
+        for mob_dict in mobs_dict:
+            name = mob_dict["name"]
+            mob_types[name] = MobType.from_dict(mob_dict)
+        recipes = {}
+        for name in recipes_dict:
+            recipes[name] = Recipe.from_dict(recipes_dict[name])
+        loot = JSONDict(loot_dict)
+        mining_loot = {name: LootTable.from_list(entries) for name, entries in loot.gettype("mining", dict).items()}
+        explosion_loot = {name: LootTable.from_list(entries) for name, entries in loot.gettype("explosions", dict).items()}
+        return Content(mob_types, recipes, mining_loot, explosion_loot)
+        
+    def compile(self):
+        "Flattens the content into plain tuples, which pickle and unpickle much faster than the objects"
+        mobs = [(typ.name, typ.weight, typ.hp, typ.behavior.name, typ.death_drops, typ.attack_strength, typ.spawns_naturally) for typ in self.mob_types.values()]
+        recipes = []
+        for name, recipe in self.recipes.items():
+            tool = recipe.tool_data
+            tool_data = (tool.damage, tool.durability, tool.attack_speed, tool.mining_mult) if tool else None
+            recipes.append((name, recipe.quantity, recipe.components, tool_data))
+        mining_loot = [(name, table.entries) for name, table in self.mining_loot.items()]
+        explosion_loot = [(name, table.entries) for name, table in self.explosion_loot.items()]
+        return mobs, recipes, mining_loot, explosion_loot
+    
+    @staticmethod
+    def from_compiled(compiled):
+        "Rebuilds the content from compile()'s output, skipping validation since it was validated before compiling"
+        mobs, recipes, mining_loot, explosion_loot = compiled
+        mob_types = {}
+        for name, weight, hp, behavior, death_drops, attack_strength, spawns_naturally in mobs:
+            mob_types[name] = MobType(name, weight, hp, MobBehaviorType[behavior], death_drops, attack_strength, spawns_naturally)
+        recipe_objs = {}
+        for name, quantity, components, tool_data in recipes:
+            recipe_objs[name] = Recipe(quantity, components, ToolData(*tool_data) if tool_data else None)
+        mining_loot = {name: LootTable(entries) for name, entries in mining_loot}
+        explosion_loot = {name: LootTable(entries) for name, entries in explosion_loot}
+        return Content(mob_types, recipe_objs, mining_loot, explosion_loot)
+
+def file_stamp(path):
+    st = os.stat(path)
+    return (st.st_mtime_ns, st.st_size)
+
+def file_hash(path):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def load_content(files=CONTENT_FILES, cache_path=CONTENT_CACHE):
+    """Loads the content from the compiled cache if the data files haven't changed since it was written, otherwise from the data files, rewriting the cache
+    A file counts as unchanged if its mtime and size match, or failing that, its hash"""
+    stamps = {path: file_stamp(path) for path in files}
+    hashes = None
+    try:
+        with open(cache_path, "rb") as f:
+            version, sources, compiled = pickle.load(f)
+    except Exception: #A missing or unreadable cache just gets rebuilt
+        version = None
+    if version == CONTENT_CACHE_VERSION and sources.keys() == stamps.keys():
+        if all(sources[path][0] == stamps[path] for path in files):
+            return Content.from_compiled(compiled)
+        hashes = {path: file_hash(path) for path in files}
+        if all(sources[path][1] == hashes[path] for path in files):
+            write_content_cache(cache_path, stamps, hashes, compiled)
+            return Content.from_compiled(compiled)
+    mobs_path, recipes_path, loot_path = files
+    with open(mobs_path) as f:
+        mobs_dict = json.load(f)
+    with open(recipes_path) as f:
+        recipes_dict = json.load(f)
+    with open(loot_path) as f:
+        loot_dict = json.load(f)
+    content = Content.from_json(mobs_dict, recipes_dict, loot_dict)
+    write_content_cache(cache_path, stamps, hashes or {path: file_hash(path) for path in files}, content.compile())
+    return content
+
+def write_content_cache(cache_path, stamps, hashes, compiled):
+    sources = {path: (stamps[path], hashes[path]) for path in stamps}
+    temp_path = f"{cache_path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+        with open(temp_path, "wb") as f:
+            pickle.dump((CONTENT_CACHE_VERSION, sources, compiled), f, pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, cache_path) #Atomic, so other processes never see half a cache
+    except OSError: #The game still works without a cache, e.g. from a read-only directory
+        pass
+
+content = None
+
+def get_content():
+    global content
+    if content is None:
+        content = load_content()
+    return content
+
+def extract_content_messages(fileobj, keywords, comment_tags, options):
+    """A pybabel extraction method for the data files (see babel.cfg), yielding the names of the items in one, which are shown translated
+    Mob names aren't, so they are left out"""
+    text = fileobj.read().decode("utf-8")
+    data = json.loads(text)
+    kind = os.path.basename(fileobj.name)
+    names = []
+    if kind == "mobs.json":
+        for mob in data:
+            for drop in mob.get("death_drops", ()):
+                item = drop["item"]
+                names.extend(item if isinstance(item, list) else [item])
+    elif kind == "recipes.json":
+        for name, recipe in data.items():
+            names.append(name)
+            names.extend(component[0] for component in recipe["components"])
+    elif kind == "loot.json":
+        for tables in data.values():
+            for entries in tables.values():
+                names.extend(entry["item"] for entry in entries)
+    lines = text.splitlines()
+    for name in dict.fromkeys(names):
+        if name != "EXP":
+            lineno = next((number for number, line in enumerate(lines, 1) if f'"{name}"' in line), 0)
+            yield lineno, None, name, []
+
+def __getattr__(name):
+    "Lets mob_types, recipes, day_mob_types and the loot tables be read off the module, loading the content the first time"
+    if name in ("mob_types", "recipes", "day_mob_types", "mining_loot", "explosion_loot"):
+        return getattr(get_content(), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 #foods = json.load(open("foods.json"))
             
+class Scheduler:
+    """Calls actions at set points on a clock, kept in a heap so that advancing the clock only costs the events that come due
+    However far the clock jumps, each event fires in order, once for every time it came due"""
+    
+    def __init__(self, now=0):
+        self.now = now
+        self.queue = []
+        self.count = 0 #Breaks ties, so events due at the same time fire in the order they were scheduled
+        
+    def schedule(self, delay, action, interval=None):
+        "Calls action() delay from now, then every interval after that if one is given; returns the event, to be passed to cancel"
+        event = [self.now + delay, self.count, action, interval]
+        self.count += 1
+        heapq.heappush(self.queue, event)
+        return event
+        
+    def cancel(self, event):
+        event[2] = None #Left in the heap and dropped when it comes up, as taking it out would mean a search
+        
+    def advance(self, amount):
+        target = self.now + amount
+        queue = self.queue
+        while queue and queue[0][0] <= target:
+            event = heapq.heappop(queue)
+            due, count, action, interval = event
+            if action is None:
+                continue
+            self.now = due
+            if interval is not None:
+                event[0] = due + interval
+                event[1] = self.count
+                self.count += 1
+                heapq.heappush(queue, event)
+            action()
+        self.now = target
+
 class Time:
+    #A day lasts 40 minutes, and each phase starts at the minute given here
+    phases = (("day", 0), ("sunset", 18), ("night", 20), ("sunrise", 38))
+    day_length = 40 * 60
     
-    def __init__(self):
-        self.mins = 0
-        self.secs = 0
+    def __init__(self, mins=0, secs=0, elapsed=0):
+        self.mins = mins
+        self.secs = secs
+        self.elapsed = elapsed
+        self.events = Scheduler(elapsed) #Everything timed in the game goes here, so it runs as the clock passes it
+        time_of_day = mins * 60 + secs
+        self.phase = None
+        for phase, start in self.phases:
+            if time_of_day >= start * 60:
+                self.phase = phase
+            delay = (start * 60 - time_of_day) % self.day_length or self.day_length
+            self.events.schedule(delay, functools.partial(self.change_phase, phase), self.day_length)
+        
+    def is_night(self):
+        return self.phase in ("night", "sunrise")
         
-    #def is_night(self):
-    #   return self.mins >= 20
+    def change_phase(self, phase):
+        self.phase = phase
+        #if phase == "night":
+        #   screen.cprint("It is now nighttime", "blue")
+        #elif phase == "day":
+        #   screen.cprint("It is now daytime", "blue")
+        #elif phase == "sunset":
+        #   screen.cprint("The sun begins to set", "blue")
+        #elif phase == "sunrise":
+        #   screen.cprint("The sun begins to come up", "blue")
     
     def advance(self, secs):
-        #was_night = self.is_night()
-        #last_mins = self.mins
-        self.secs += secs
-        while self.secs >= 60:
-            self.mins += 1
-            self.secs -= 60
-        self.mins %= 40
-        #is_night = self.is_night()
-        #if was_night ^ is_night:
-        #   if is_night:
-        #       cprint("It is now nighttime", "blue")
-        #   else:
-        #       cprint("It is now daytime", "blue")
-        #elif last_mins < 18 and self.mins >= 18:
-        #   cprint("The sun begins to set", "blue")
-        #elif last_mins < 38 and self.mins >= 38:
-        #   cprint("The sun begins to come up", "blue")
+        self.elapsed += secs
+        mins, self.secs = divmod(self.secs + secs, 60)
+        self.mins = int(self.mins + mins) % 40
+        self.events.advance(secs)
             
 class StatusEffect:
+    __slots__ = ("level", "duration", "expires", "events")
     
     def __init__(self, level, duration):
         self.level = level
         self.duration = duration
+        self.expires = None #Set, along with the events, once the effect is on a player
+        self.events = ()
 
 def get_exp_required_for_level(level):
     assert level >= 0
@@ -327,6 +1185,84 @@ def get_exp_required_for_level(level):
         return round(2.5 * level**2 - 40.5 * level + 360)
     return round(4.5 * level**2 - 160.5 * level + 2220)
 
+def get_level_for_exp(exp):
+    """Returns the level reached with exp EXP in total, which is the lowest level whose requirement is above it
+    Each segment of get_exp_required_for_level is inverted with the quadratic formula, then nudged for its rounding"""
+    if exp < 0:
+        return 0
+    if exp < get_exp_required_for_level(16):
+        level = math.floor(math.sqrt(exp + 9) - 3) + 1
+    elif exp < get_exp_required_for_level(31):
+        level = math.floor((40.5 + math.sqrt(40.5**2 - 10 * (360 - exp))) / 5) + 1
+    else:
+        level = math.floor((160.5 + math.sqrt(160.5**2 - 18 * (2220 - exp))) / 9) + 1
+    while get_exp_required_for_level(level) <= exp:
+        level += 1
+    while level > 0 and get_exp_required_for_level(level - 1) > exp:
+        level -= 1
+    return level
+
+class Inventory:
+    """How many of each item the player has, as an array of counts indexed by the item's id in the content's registry
+    Reads like a dict of item name -> amount that leaves out items there are none of
+    Items missing from the registry, e.g. ones from an old save, are counted in a dict on the side"""
+    __slots__ = ("ids", "names", "counts", "extra")
+    
+    def __init__(self, content):
+        self.ids = content.item_ids
+        self.names = content.item_names
+        self.counts = array("q", [0]) * len(self.names) #64-bit, as plain ints had no limit before
+        self.extra = {}
+        
+    def count(self, item):
+        i = self.ids.get(item)
+        if i is None:
+            return self.extra.get(item, 0)
+        return self.counts[i]
+        
+    def add(self, item, amount):
+        "Changes the count of item by amount, which can be negative"
+        i = self.ids.get(item)
+        if i is None:
+            amount += self.extra.get(item, 0)
+            if amount > 0:
+                self.extra[item] = amount
+            else:
+                self.extra.pop(item, None)
+        else:
+            self.counts[i] += amount
+        
+    def __getitem__(self, item):
+        amount = self.count(item)
+        if amount <= 0:
+            raise KeyError(item)
+        return amount
+        
+    def get(self, item, default=None):
+        amount = self.count(item)
+        return amount if amount > 0 else default
+        
+    def __contains__(self, item):
+        return self.count(item) > 0
+        
+    def __iter__(self):
+        names = self.names
+        for i, amount in enumerate(self.counts):
+            if amount > 0:
+                yield names[i]
+        yield from self.extra
+        
+    def keys(self):
+        return iter(self)
+        
+    def items(self):
+        return ((item, self.count(item)) for item in self)
+        
+    def __len__(self):
+        return len(self.counts) - self.counts.count(0) + len(self.extra)
+
+ticking_status_effects = ("Poison",) #Effects that do something every second, rather than just while checked
+
 class Player:
     
     def __init__(self):
@@ -334,14 +1270,62 @@ class Player:
         #self.hunger = 20
         #self.food_exhaustion = 0
         self.saturation = 5
-        self.inventory = {}
+        content = get_content()
+        self.inventory = Inventory(content)
         self.tools = []
+        self.tools_by_type = {} #The same tools, listed under their names
         self.curr_weapon = None
         self.EXP = 0
         self.level = 0
         self.time = Time()
         self.ticks = 0
+        self.schedule_regeneration()
         self.status_effects = {}
+        self.tools_broken = Counter()
+        self.craftable = set(content.recipes_without_components) #Kept up to date by add_item and remove_item
+        
+    def to_dict(self):
+        "Everything needed to restore the player, in the form used by save files"
+        return {
+            "HP": self.HP,
+            "saturation": self.saturation,
+            "inventory": dict(self.inventory),
+            "tools": [tool.to_list() for tool in self.tools],
+            "weapon": self.tools.index(self.curr_weapon) if self.curr_weapon else None,
+            "EXP": self.EXP,
+            "level": self.level,
+            "time": [self.time.mins, self.time.secs, self.time.elapsed],
+            "ticks": self.ticks,
+            "status_effects": {name: [effect.level, effect.expires - self.time.elapsed] for name, effect in self.status_effects.items()},
+            "tools_broken": dict(self.tools_broken),
+        }
+        
+    @json_dict
+    @staticmethod
+    def from_dict(d):
+        player = Player()
+        player.HP = d.gettype("HP", float)
+        player.saturation = d.gettype("saturation", float)
+        for item, amount in d.gettype("inventory", dict).items():
+            player.add_item(item, amount)
+        for tool in d.gettype("tools", list):
+            player.add_tool(Tool.from_list(tool))
+        weapon = d.get("weapon")
+        if weapon is not None:
+            if not isinstance(weapon, int) or not 0 <= weapon < len(player.tools):
+                raise JSONError(f"invalid weapon index {weapon!r}", d)
+            player.curr_weapon = player.tools[weapon]
+        player.EXP = d.gettype("EXP", int)
+        player.level = d.gettype("level", int)
+        mins, secs, elapsed = d.gettype("time", list)
+        player.time = Time(mins, secs, elapsed)
+        player.ticks = d.gettype("ticks", int)
+        player.schedule_regeneration()
+        for name, (level, duration) in d.gettype("status_effects", dict).items():
+            effect = player.status_effects[name] = StatusEffect(level, duration)
+            player.schedule_status_effect(name, effect)
+        player.tools_broken.update(d.gettype("tools_broken", dict))
+        return player
         
     def get_effect_level(self, name):
         if name not in self.status_effects:
@@ -357,18 +1341,31 @@ class Player:
             return
         cur_level = self.get_effect_level(name)
         if cur_level == 0:
-            self.status_effects[name] = StatusEffect(level, duration)
+            effect_obj = self.status_effects[name] = StatusEffect(level, duration)
+            self.schedule_status_effect(name, effect_obj)
         elif level > cur_level:
             effect_obj = self.status_effects[name]
             effect_obj.level = level
             effect_obj.duration = duration
+            self.schedule_status_effect(name, effect_obj)
+            
+    def schedule_status_effect(self, name, effect):
+        "Sets up the effect to expire once its duration has passed, and to tick every second until then if it acts over time"
+        events = self.time.events
+        for event in effect.events:
+            events.cancel(event)
+        effect.expires = events.now + effect.duration
+        effect.events = [events.schedule(effect.duration, functools.partial(self.expire_status_effect, name))]
+        if name in ticking_status_effects:
+            effect.events.append(events.schedule(1, functools.partial(self.tick_status_effect, name), 1))
+            
+    def expire_status_effect(self, name):
+        effect = self.status_effects.pop(name)
+        for event in effect.events:
+            self.time.events.cancel(event)
         
     def advance_time(self, secs):
         self.time.advance(secs)
-        for effect in list(self.status_effects.keys()): #Convert to list to save a snapshot of the keys so we can avoid RuntimeError due to changing the size during iteration
-            self.status_effects[effect].duration -= secs
-            if self.status_effects[effect] <= 0:
-                del self.status_effects[effect]
                 
     def tick_status_effect(self, name):
         if name not in self.status_effects:
@@ -383,39 +1380,47 @@ class Player:
             amount = min(self.HP - 1, round_stochastic(20 / rate)) #Poison reduces us to 1 HP but doesn't kill us
             self.damage(amount, physical=False)
         
-    def damage(self, amount, death_reason=None, physical=True):
+    def damage(self, amount, death_reason=None, physical=True, killer=None):
         if amount <= 0:
             return
-        cprint(_("You take {0} damage!").format(amount), "red")
+        if screen.enabled:
+            screen.cprint(_("You take {0} damage!").format(amount), "red")
         self.HP -= amount
         #if physical:
         #   self.mod_food_exhaustion(0.1)
         if self.HP <= 0:
-            self.die(death_reason)
+            self.die(death_reason, killer)
         self.print_health()
         
     def gain_exp(self, amount):
-        amount = round_stochastic(amount)
+        self.add_exp(round_stochastic(amount))
+        
+    def gain_exp_many(self, amounts):
+        "Applies many EXP rewards at once, each rounded as gain_exp would, with a single level update and message"
+        self.add_exp(sum(round_stochastic(amount) for amount in amounts))
+        
+    def add_exp(self, amount):
         if amount <= 0:
             return
         self.EXP += amount
-        print(_("+{0} EXP").format(amount))
         old_level = self.level
-        while get_exp_required_for_level(self.level) <= self.EXP:
-            self.level += 1
-        if self.level > old_level:
-            cprint(_("You have reached level {0}!").format(self.level), "green")
-        print(_("Current EXP: {0}/{1}").format(self.EXP,get_exp_required_for_level(self.level)))
-        
-    def die(self, death_reason=None):
-        print(_("You died!"))
+        self.level = max(self.level, get_level_for_exp(self.EXP))
+        if screen.enabled:
+            screen.print(_("+{0} EXP").format(amount))
+            if self.level > old_level:
+                screen.cprint(_("You have reached level {0}!").format(self.level), "green")
+            screen.print(_("Current EXP: {0}/{1}").format(self.EXP,get_exp_required_for_level(self.level)))
+        
+    def die(self, death_reason=None, killer=None):
+        screen.print(_("You died!"))
         if death_reason:
-            print(death_reason)
-        print("\n"+_("Score: {0}").format(self.EXP))
-        exit()
+            screen.print(death_reason)
+        screen.print("\n"+_("Score: {0}").format(self.EXP))
+        raise GameOver(death_reason, killer)
         
     def print_health(self):
-        print(_("HP: {0}/20").format(self.HP))
+        if screen.enabled:
+            screen.print(_("HP: {0}/20").format(self.HP))
         
     def heal(self, amount):
         if amount <= 0:
@@ -424,34 +1429,61 @@ class Player:
         self.HP = min(self.HP + amount, 20)
         healed_by = self.HP - old_hp
         if healed_by > 0:
-            cprint(_("You are healed by {0} HP.").format(healed_by), "green")
+            if screen.enabled:
+                screen.cprint(_("You are healed by {0} HP.").format(healed_by), "green")
             self.print_health()
             return True
         return False
      
+    def schedule_regeneration(self):
+        "Counts ticks on their own clock, with regeneration due on every fourth one"
+        self.tick_events = Scheduler(self.ticks)
+        self.tick_events.schedule(4 - self.ticks % 4, self.regenerate, 4)
+        self.in_battle = False
+        
+    def regenerate(self):
+        if (self.HP < 20) and (self.in_battle == False):
+            self.heal(1)
+     
     def tick(self, is_battle):
         self.ticks += 1
-        if (self.HP < 20) and (self.ticks % 4 == 0) and (is_battle == False):
-            self.heal(1)
+        self.in_battle = is_battle
+        self.tick_events.advance(1)
         self.advance_time(0.5)
     
     def add_item(self, item, amount=1):
-        if item in self.inventory:
-            self.inventory[item] += amount
-        else:
-            self.inventory[item] = amount
+        self.inventory.add(item, amount)
+        self.update_craftable(item)
             
     def add_tool(self, tool):
         self.tools.append(tool)
+        self.tools_by_type.setdefault(tool.name, []).append(tool)
+        
+    def remove_tool(self, tool):
+        self.tools.remove(tool)
+        same_type = self.tools_by_type[tool.name]
+        same_type.remove(tool)
+        if not same_type:
+            del self.tools_by_type[tool.name]
             
     def remove_item(self, item, amount):
         if amount <= 0:
             return
-        if item not in self.inventory or amount > self.inventory[item]:
+        if amount > self.inventory.count(item):
             raise ValueError("Tried to remove more of item than available in inventory")
-        self.inventory[item] -= amount
-        if self.inventory[item] <= 0:
-            del self.inventory[item]
+        self.inventory.add(item, -amount)
+        self.update_craftable(item)
+        
+    def count_item(self, item):
+        return self.inventory.count(item)
+        
+    def update_craftable(self, item):
+        content = get_content()
+        for name in content.recipes_using.get(item, ()):
+            if self.can_make_recipe(content.recipes[name]):
+                self.craftable.add(name)
+            else:
+                self.craftable.discard(name)
             
     def armed(self):
         return self.curr_weapon is not None
@@ -463,25 +1495,22 @@ class Player:
         return self.curr_weapon.attack_speed if self.armed() else 4
         
     def has_item(self, item, amount=1):
-        if item not in self.inventory:
-            return False
-        return self.inventory[item] >= amount
+        count = self.inventory.count(item)
+        return count > 0 and count >= amount
         
     def has_any_item(self, names):
         return any(name in self.inventory for name in names)
         
     def has_tool(self, tool_name):
-        return any(tool.name == tool_name for tool in self.tools)
+        return tool_name in self.tools_by_type
     
     def has_any_tool(self, tool_names):
-        l1 = set(tool_names)
-        l2 = set(tool.name for tool in self.tools)
-        return not l1.isdisjoint(l2)
+        return any(name in self.tools_by_type for name in tool_names)
         
     def can_make_recipe(self, recipe):
-        for component in recipe.components:
-            name, amount = component
-            if not self.has_item(name, amount):
+        counts = self.inventory.counts
+        for item_id, amount in recipe.component_ids:
+            if counts[item_id] < amount:
                 return False
         return True 
             
@@ -490,37 +1519,68 @@ class Player:
         if tool:
             tool.durability -= 1
             if tool.durability < 0:
-                cprint(_("Your {0} is destroyed!").format(tool.name), "red")
-                self.tools.remove(tool)
+                screen.cprint(_("Your {0} is destroyed!").format(_(tool.name)), "red")
+                self.remove_tool(tool)
+                self.tools_broken[tool.name] += 1
                 self.curr_weapon = None
-            else:
-                print(_("Durability: {0}").format(durability_message(tool.durability, tool.max_durability)))
+            elif screen.enabled:
+                screen.print(_("Durability: {0}").format(durability_message(tool.durability, tool.max_durability)))
             
     def switch_weapon_menu(self):
         if len(self.tools) > 0:
-            options = [] 
+            options = [tool.name for tool in self.tools] + [N_("Unarmed")]
+            labels = [] 
             for tool in self.tools:
-                options.append(_("{0} - Durability {1}").format(tool.name,durability_message(tool.durability, tool.max_durability)))
-            options.append(_("Unarmed"))
-            print(_("Which weapon would you like to switch to?"))
-            choice = choice_input(*options)
+                labels.append(_("{0} - Durability {1}").format(_(tool.name),durability_message(tool.durability, tool.max_durability)))
+            labels.append(_("Unarmed"))
+            screen.print(_("Which weapon would you like to switch to?"))
+            choice = yield Choice(*options, labels=labels)
             if choice == len(self.tools) + 1:
-                print(_("You decide to go unarmed"))
+                screen.print(_("You decide to go unarmed"))
                 self.curr_weapon = None
             else:
                 weapon = self.tools[choice - 1]
-                print(_("You switch to your {0}").format(weapon.name))
+                screen.print(_("You switch to your {0}").format(_(weapon.name)))
                 self.curr_weapon = weapon
             
 class Tool:
+    "A tool the player owns: only its durability is its own, the rest of its stats are shared with every tool made from the same recipe"
+    __slots__ = ("name", "data", "durability")
     
-    def __init__(self, name, damage, durability, mining_mult, attack_speed):
+    def __init__(self, name, data, durability=None):
         self.name = name
-        self.damage = damage
-        self.durability = durability
-        self.max_durability = durability
-        self.mining_mult = mining_mult
-        self.attack_speed = attack_speed
+        self.data = data
+        self.durability = data.durability if durability is None else durability
+        
+    @property
+    def damage(self):
+        return self.data.damage
+        
+    @property
+    def max_durability(self):
+        return self.data.durability
+        
+    @property
+    def mining_mult(self):
+        return self.data.mining_mult
+        
+    @property
+    def attack_speed(self):
+        return self.data.attack_speed
+        
+    def to_list(self):
+        return [self.name, self.damage, self.durability, self.max_durability, self.mining_mult, self.attack_speed]
+        
+    @staticmethod
+    def from_list(l):
+        if not isinstance(l, list) or len(l) != 6:
+            raise JSONError("Each saved tool must be a 6-item list", l)
+        name, damage, durability, max_durability, mining_mult, attack_speed = l
+        recipe = get_content().recipes.get(name)
+        data = recipe.tool_data if recipe else None
+        if data is None or (data.damage, data.durability, data.mining_mult, data.attack_speed) != (damage, max_durability, mining_mult, attack_speed):
+            data = ToolData(damage, max_durability, attack_speed, mining_mult) #Saved before its recipe changed, so it keeps its own stats
+        return Tool(name, data, durability)
                 
 def durability_message(durability, max_durability):
     durability_msg = f"{durability}/{max_durability}"
@@ -530,57 +1590,68 @@ def durability_message(durability, max_durability):
         color = "yellow"
     else:
         color = "green"
-    return colored(durability_msg, color)
+    return screen.colored(durability_msg, color)
+    
     
-def random_battle(player, action_verb):
-    _ = lang_ru.gettext
+flee_miss_messages = (
+    N_("You try to attack the {} while it was fleeing, and miss."),
+    N_("You swing at the {}, but miss as it was running away too fast."),
+    N_("The {} was fleeing too quickly, you miss!"),
+    N_("You swing at the {}, and miss narrowly."),
+    N_("You try to attack the {} while it was running away, and miss.")
+)
+
+def random_battle(player, action_verb, explosion_loot=None, mob_type=None):
+    """action_verb is a message id
+    A creeper exploding drops items from explosion_loot if it is given, or nothing otherwise
+    The mob is picked at random unless mob_type names one"""
     #if night_mob:
     #   choices = night_mob_types
     #else:
-    choices = day_mob_types
-    mob = Mob.new_mob(choices.pick())
+    choices = get_content().day_mob_types
+    mob = Mob.new_mob(mob_type or choices.pick())
     #mob = Mob.new_mob("Enderman")
     if mob.name == "Baby Zombie" and one_in(20):
+        mob.release()
         mob = Mob.new_mob("Chicken Jockey")
     mob_name = mob.name.lower()
-    a_an = "an" if mob_name[0] in "aeiou" else "a"
-    p1 = _("You found")
-    p2 = _("while")
-    print(p1 + " {0} {1} ".format(a_an,mob_name) + p2 + " {0}{1}".format(action_verb,'!' if mob.behavior == MobBehaviorType.hostile else '.'))
+    if screen.enabled:
+        a_an = "an" if mob_name[0] in "aeiou" else "a"
+        p1 = _("You found")
+        p2 = _("while")
+        screen.print(p1 + " {0} {1} ".format(a_an,mob_name) + p2 + " {0}{1}".format(_(action_verb),'!' if mob.behavior == MobBehaviorType.hostile else '.'))
     if mob.behavior == MobBehaviorType.hostile and not mob_name.endswith("creeper") and one_in(2):
-        cprint(_("The {0} attacks you!").format(mob_name), "red")
-        player.damage(mob.attack_strength)
+        if screen.enabled:
+            screen.cprint(_("The {0} attacks you!").format(mob_name), "red")
+        player.damage(mob.attack_strength, killer=mob.name)
     if mob.name == "Chicken" and one_in(15):
-        print("You got 1x Egg")
-        player.add_item("Egg")
+        if screen.enabled:
+            screen.print(_("You found 1x {}").format(_("Egg")))
+        player.add_item(N_("Egg"))
     creeper_turn = 0
-    choice = choice_input(_("Attack"), _("Flee") if mob.behavior == MobBehaviorType.hostile else _("Ignore"))
+    choice = yield Choice(N_("Attack"), N_("Flee") if mob.behavior == MobBehaviorType.hostile else N_("Ignore"))
     if choice == 1:
-        if len(player.tools) > 0 and yes_no(_("Would you like to switch weapons?")):
-            player.switch_weapon_menu()
+        if len(player.tools) > 0 and (yield YesNo(N_("Would you like to switch weapons?"))):
+            yield from player.switch_weapon_menu()
         run = 0
         while True:
             if run > 0:
                 run -= 1
-                if run == 0:
-                    print(_("The {0} stops running.").format(mob_name))
+                if run == 0 and screen.enabled:
+                    screen.print(_("The {0} stops running.").format(mob_name))
             #player.mod_food_exhaustion(0.1)
             is_enderman = mob.name == "Enderman"
             miss_chance = 5 if is_enderman else 10
             if one_in(miss_chance):
-                if is_enderman:
-                    print(_("You swing at the {0} but it teleports away.").format(mob_name))
-                else:
-                    print(_("You swing at the {0} but miss.").format(mob_name))
+                if screen.enabled:
+                    if is_enderman:
+                        screen.print(_("You swing at the {0} but it teleports away.").format(mob_name))
+                    else:
+                        screen.print(_("You swing at the {0} but miss.").format(mob_name))
             elif run > 0 and not one_in(3) and x_in_y(1, player.attack_speed() + 1):
-                flee_miss_messages = [
-                    _("You try to attack the {} while it was fleeing, and miss."),
-                    _("You swing at the {}, but miss as it was running away too fast."),
-                    _("The {} was fleeing too quickly, you miss!"),
-                    _("You swing at the {}, and miss narrowly."),
-                    _("You try to attack the {} while it was running away, and miss.")
-                ]
-                print(random.choice(flee_miss_messages).format(mob_name))
+                message = rng.choice(flee_miss_messages) #Drawn even when nothing is shown, so headless games play out the same
+                if screen.enabled:
+                    screen.print(_(message).format(mob_name))
             else:           
                 damage = player.attack_damage()
                 is_critical = one_in(10)
@@ -588,224 +1659,1199 @@ def random_battle(player, action_verb):
                 if is_critical:
                     damage = int(damage * 1.5)
                     is_critical = is_critical and damage > base_damage
-                print(_("You attack the {0}.{1}").format(mob_name,_(' Critical!') if is_critical else '')) #TODO: Vary this message based on wielded weapon
+                if screen.enabled:
+                    screen.print(_("You attack the {0}.{1}").format(mob_name,_(' Critical!') if is_critical else '')) #TODO: Vary this message based on wielded weapon
                 player.decrement_tool_durability()
                 mob.damage(damage, player)
                 if mob.HP <= 0:
                     break
                 if mob.behavior == MobBehaviorType.passive:
                     if not one_in(damage + 1) and run == 0:
-                        print(_("The {} starts running away.").format(mob_name))
-                        run += random.randint(3, 5)
+                        if screen.enabled:
+                            screen.print(_("The {} starts running away.").format(mob_name))
+                        run += rng.randint(3, 5)
             attack_speed = player.attack_speed() #Attack speed controls the chance of being attacked by a mob when we attack
-            #time.sleep(random.uniform(0.75, 1.25) / attack_speed)
+            #time.sleep(rng.uniform(0.75, 1.25) / attack_speed)
             if mob_name.endswith("creeper"):
                 creeper_turn += 1
                 if creeper_turn > 2 and not one_in(creeper_turn): #Increasing chance to explode after the first 2 turns
-                    damage = max(random.randint(1, mob.attack_strength) for _ in range(3)) #attack_strength defines explosion power for creepers
-                    print(_("The creeper explodes!"))
-                    player.damage(damage, _("Killed by a creeper's explosion"))
+                    damage = max(rng.randint(1, mob.attack_strength) for i in range(3)) #attack_strength defines explosion power for creepers
+                    screen.print(_("The creeper explodes!"))
+                    player.damage(damage, _("Killed by a creeper's explosion"), killer=mob.name)
                     explosion_power = 6 if mob.name == "Charged Creeper" else 3
-                    if action_verb == _("mining"):
-                        minables.add(_("Stone"), 3000) #Explosions drop the block instead of the item
-                        minables.add(_("Coal Ore"), 124)
-                        minables.add(_("Iron Ore"), 72)
-                        minables.add(_("Lapis Lazuli Ore"), 3)
-                        minables.add(_("Gold Ore"), 7)
-                        minables.add(_("Diamond Ore"), 3)
-                        num = int((explosion_power * random.uniform(0.75, 1.25)) ** 2) + 1
-                        found = {}
-                        for _ in range(num):
-                            if one_in(explosion_power):
-                                s = minables.pick()
-                                if s in found:
-                                    found[s] += 1
-                                else:
-                                    found[s] = 1
-                        if len(found) > 0:
-                            print(_("You got the following items from the explosion:"))
-                            for item in found:
-                                print(f"{found[item]}x {item}")
-                                player.add_item(item, found[item])
-                    else:
-                        grass = random.randint(explosion_power // 3, explosion_power) + 1
-                        dirt = int((explosion_power * random.uniform(0.75, 1.25)) ** 2) + 1
-                        grass = binomial(grass, 1, explosion_power)
-                        dirt = binomial(dirt, 1, explosion_power)
-                        player.add_item(_("Dirt"), dirt)
-                        player.add_item(_("Grass"), grass)
-                        if grass > 0:
-                            if dirt > 0:
-                                print(_("You got {0}x Grass and {1}x Dirt from the explosion").format(grass,dirt))
-                            else:
-                                print(_("You got {0}x Grass from the explosion").format(grass))
-                        elif dirt > 0:
-                            print(_("You got {0}x Dirt from the explosion").format(dirt))
+                    if explosion_loot is not None: #Explosions drop the block instead of the item
+                        num = int((explosion_power * rng.uniform(0.75, 1.25)) ** 2) + 1
+                        found = Counter(explosion_loot.pick_many(binomial(num, 1, explosion_power)))
+                        if len(found) > 0 and screen.enabled:
+                            screen.print(_("You got the following items from the explosion:"))
+                        for item in found:
+                            if screen.enabled:
+                                screen.print(f"{found[item]}x {_(item)}")
+                            player.add_item(item, found[item])
                     break
-                else:
-                    print(_("The creeper flashes..."))
+                elif screen.enabled:
+                    screen.print(_("The creeper flashes..."))
             elif mob.behavior != MobBehaviorType.passive and x_in_y(1, attack_speed) and not one_in(8): #I use x_in_y instead of one_in because x_in_y works with floats
-                print(_("The {0} attacks you!").format(mob_name))
-                player.damage(round_stochastic(mob.attack_strength))
+                if screen.enabled:
+                    screen.print(_("The {0} attacks you!").format(mob_name))
+                player.damage(round_stochastic(mob.attack_strength), killer=mob.name)
             player.tick(True)
-            choice = choice_input(_("Attack"), _("Ignore") if mob.behavior == MobBehaviorType.passive else _("Flee"))
+            choice = yield Choice(N_("Attack"), N_("Ignore") if mob.behavior == MobBehaviorType.passive else N_("Flee"))
             if choice == 2:
-                return
-                
-splashes = open("splashes.txt",encoding="utf-8").read().splitlines()
+                break
+    mob.release()
 
-print("""
-   _____ _______       _____   _____ _____            ______ _______ 
-  / ____|__   __|/\   |  __ \ / ____|  __ \     /\   |  ____|__   __|
- | (___    | |  /  \  | |__) | |    | |__) |   /  \  | |__     | |   
-  \___ \   | | / /\ \ |  _  /| |    |  _  /   / /\ \ |  __|    | |   
-  ____) |  | |/ ____ \| | \ \| |____| | \ \  / ____ \| |       | |   
- |_____/   |_/_/    \_\_|  \_\\______|_|  \_\/_/    \_\_|       |_|   
-""")
-print()
-print()
-cprint(random.choice(splashes), "yellow", attrs=["bold"])
-print()
-choice = choice_input(_("Play"), _("Quit"))
-if choice == 2:
-    exit()
-    
-player = Player()
+def explore(player):
+    if screen.enabled:
+        screen.print(_("You explore for a while."))
+    time_explore = rng.randint(15, 20)
+    #time.sleep(time_explore / 20)
+    #player.mod_food_exhaustion(0.001 * time_explore)
+    player.advance_time(time_explore)
+    mob_chance = 3 #daytime - 3, night - 8
+    if one_in(mob_chance):
+        yield from random_battle(player, N_("exploring"), get_content().explosion_loot.get("exploring"))
+    elif x_in_y(3, 5):
+        explore_finds = [(N_("Grass"), 8), (N_("Dirt"), 1), (N_("Wood"), 4)]
+        choices = [val[0] for val in explore_finds]
+        weights = [val[1] for val in explore_finds]
+        found = rng.weighted_choice(choices, weights)
+        if screen.enabled:
+            screen.print(_("You found 1x {}").format(_(found)))
+        player.add_item(found)
 
-while True:
+def show_inventory(player):
+    if len(player.inventory) == 0:
+        screen.print(_("There is nothing in your inventory"))
+    else:
+        screen.print(_("Your inventory:"))
+        for item in player.inventory:
+            screen.print(f"{player.inventory[item]}x {_(item)}")
+        screen.print(_("Your tools:"))
+        for index, tool in enumerate(player.tools):
+            screen.print(_("{0}. {1} - Durability {2}/{3}").format(index+1,_(tool.name),tool.durability,tool.max_durability))
+
+def plan_crafting(player, item, amount=1):
+    """Works out how to make amount of item from the player's inventory, crafting any intermediate items on the way
+    Returns (steps, missing): steps lists (recipe name, times to craft it) in the order to craft them, and missing counts the raw materials that are short"""
+    content = get_content()
+    recipes = content.recipes
+    chain = content.crafting_chain(item)
+    needs = Counter({item: amount})
+    crafts = {}
+    for name in chain: #Every recipe needing this one has already added to its needs by now
+        recipe = recipes[name]
+        short = needs[name] if name == item else needs[name] - player.count_item(name)
+        if short > 0:
+            times = -(-short // recipe.quantity)
+            crafts[name] = times
+            for component, count in recipe.components:
+                needs[component] += count * times
+    missing = Counter()
+    for name in needs:
+        if name not in crafts and name != item:
+            short = needs[name] - player.count_item(name)
+            if short > 0:
+                missing[name] = short
+    steps = [(name, crafts[name]) for name in reversed(chain) if name in crafts]
+    return steps, missing
+
+def craft_recipe(player, name, times=1):
+    info = get_content().recipes[name]
+    components = info.components
+    quantity = info.quantity * times
+    for component in components:
+        item, amount = component
+        player.remove_item(item, amount * times)
+    if info.tool_data is not None:
+        for i in range(times):
+            player.add_tool(Tool(name, info.tool_data))
+    else:
+        player.add_item(name, quantity)
+    if screen.enabled:
+        screen.print(_("You have crafted {0}x {1}").format(quantity,_(name)))
+
+def craft_chain(player, item):
+    "Crafts item along with everything it needs on the way; returns whether it could be made"
+    if item not in get_content().recipes:
+        return False
+    steps, missing = plan_crafting(player, item)
+    if missing:
+        return False
+    for name, times in steps:
+        craft_recipe(player, name, times)
+    return True
+
+def craft(player):
+    content = get_content()
+    recipes = content.recipes
+    craftable = [(recipe, recipes[recipe]) for recipe in sorted(player.craftable, key=content.recipe_order.get)]
+    if len(craftable) == 0:
+        screen.print(_("There are no items that you have the components to craft"))
+    else:
+        screen.print(_("Items you can craft:"))
+        for item in craftable:
+            name, info = item
+            quantity = info.quantity
+            string = f"{quantity}x {_(name)} |  " + _("Components: ")
+            components = info.components
+            string += ", ".join(f"{c[1]}x {_(c[0])}" for c in components)
+            screen.print(string)
+            screen.print()     
+        screen.print(_("What would you like to craft?"))
+        item_name = yield TextInput([name for name, info in craftable])
+        item_name = (catalog or get_catalog()).reverse(recipes).get(item_name, item_name) #Recipes can be typed in by their shown names too
+        if item_name in player.craftable:
+            craft_recipe(player, item_name)
+        elif item_name in recipes:
+            steps, missing = plan_crafting(player, item_name)
+            if missing:
+                screen.print(_("You can't make {0}, you are missing:").format(_(item_name)))
+                for name in missing:
+                    screen.print(f"{missing[name]}x {_(name)}")
+            else:
+                screen.print(_("To make {0} you need to craft:").format(_(item_name)))
+                for name, times in steps:
+                    screen.print(f"{times * recipes[name].quantity}x {_(name)}")
+                if (yield YesNo(N_("Craft all of them?"))):
+                    for name, times in steps:
+                        craft_recipe(player, name, times)
+        else:
+            screen.print(_("Invalid item"))
+
+def mine(player):
+    content = get_content()
+    if player.curr_weapon and player.curr_weapon.name in content.mining_loot:
+        loot = content.mining_loot[player.curr_weapon.name]
+        found = loot.pick()
+        exp_gain = loot.roll_exp(found)
+        quantity = loot.roll_quantity(found)
+        if screen.enabled:
+            screen.print(_("Mining..."))
+        #time.sleep(rng.uniform(0.75, 1.5))
+        mine_mult = player.curr_weapon.mining_mult
+        mob_chance = 10# day chance 10, night 15
+        mob_chance *= math.sqrt(mine_mult)
+        mob_chance = round(mob_chance)
+        if found == "Stone" and one_in(3):
+            if screen.enabled:
+                screen.print(_("You didn't find much of value"))
+            player.advance_time(3)
+        else:
+            if screen.enabled:
+                screen.print(_("You found") + f" {quantity}x {_(found)}")
+            player.gain_exp(exp_gain)
+            player.add_item(found, quantity)
+            #player.mod_food_exhaustion(0.005)
+            if found == "Stone":
+                base_mine_time = 1.5
+            else:
+                base_mine_time = 3
+            mine_time = round(base_mine_time / mine_mult, 2)
+            player.advance_time(mine_time)
+            player.decrement_tool_durability()
+        if one_in(mob_chance):
+            yield from random_battle(player, N_("mining"), content.explosion_loot.get("mining"))
+    else:
+        screen.print(_("You need to switch to your pickaxe to mine"))
+
+def play_turn(player):
     player.tick(False)
     #if player.time.is_night():
-    #   print("It is currently nighttime")
+    #   screen.print("It is currently nighttime")
     player.print_health()
     #player.print_hunger()
-    if player.curr_weapon:
+    if player.curr_weapon and screen.enabled:
         weapon = player.curr_weapon
-        print(_("Current weapon: {0} - Durability {1}").format(player.curr_weapon.name,durability_message(weapon.durability, weapon.max_durability)))
-    options = [_("Explore"), _("Inventory"), _("Craft")]
+        screen.print(_("Current weapon: {0} - Durability {1}").format(_(weapon.name),durability_message(weapon.durability, weapon.max_durability)))
+    options = [N_("Explore"), N_("Inventory"), N_("Craft")]
     if len(player.tools) > 0:
-        options.append(_("Switch Weapon"))
+        options.append(N_("Switch Weapon"))
     #foods_in_inv = list(filter(lambda item: item in foods, player.inventory))
     #if foods_in_inv:
     #   options.append("Eat")
-    has_pickaxe = any("Pickaxe" in tool.name for tool in player.tools)
+    mining_loot = get_content().mining_loot
+    has_pickaxe = any(name in mining_loot for name in player.tools_by_type)
     if has_pickaxe:
-        options.append(_("Mine"))
-    choice = choice_input(*options, return_text=True)
-    if choice == _("Explore"):
-        print(_("You explore for a while."))
-        time_explore = random.randint(15, 20)
-        #time.sleep(time_explore / 20)
-        #player.mod_food_exhaustion(0.001 * time_explore)
-        player.advance_time(time_explore)
-        mob_chance = 3 #daytime - 3, night - 8
-        if one_in(mob_chance):
-            random_battle(player,_("exploring"))
-        elif x_in_y(3, 5):
-            explore_finds = [(_("Grass"), 8), (_("Dirt"), 1), (_("Wood"), 4)]
-            choices = [val[0] for val in explore_finds]
-            weights = [val[1] for val in explore_finds]
-            found = random.choices(choices, weights=weights)[0]
-            print(_("You found 1x {}").format(found))
-            player.add_item(found)
-    elif choice == _("Inventory"):
-        if len(player.inventory) == 0:
-            print(_("There is nothing in your inventory"))
-        else:
-            print(_("Your inventory:"))
-            for item in player.inventory:
-                print(f"{player.inventory[item]}x {item}")
-            print(_("Your tools:"))
-            for index, tool in enumerate(player.tools):
-                print(_("{0}. {1} - Durability {2}/{3}").format(index+1,tool.name,tool.durability,tool.max_durability))
-    elif choice == _("Craft"):
-        craftable = []
-        for recipe in recipes:
-            info = recipes[recipe]
-            if player.can_make_recipe(info):
-                craftable.append((recipe, recipes[recipe]))
-        if len(craftable) == 0:
-            print(_("There are no items that you have the components to craft"))
+        options.append(N_("Mine"))
+    choice = yield Choice(*options, return_text=True)
+    if choice == "Explore":
+        yield from explore(player)
+    elif choice == "Inventory":
+        show_inventory(player)
+    elif choice == "Craft":
+        yield from craft(player)
+    elif choice == "Switch Weapon":
+        yield from player.switch_weapon_menu()
+    elif choice == "Mine":
+        yield from mine(player)
+
+def state_delta(old, new):
+    "Returns the fields of a saved player state that changed; the inventory is diffed item by item, with 0 for items that are gone"
+    delta = {}
+    for key, value in new.items():
+        if key == "inventory":
+            old_inventory = old[key]
+            changes = {item: amount for item, amount in value.items() if old_inventory.get(item) != amount}
+            changes.update((item, 0) for item in old_inventory if item not in value)
+            if changes:
+                delta[key] = changes
+        elif old.get(key) != value:
+            delta[key] = value
+    return delta
+
+def apply_state_delta(state, delta):
+    for key, value in delta.items():
+        if key == "inventory":
+            inventory = state[key]
+            for item, amount in value.items():
+                if amount == 0:
+                    inventory.pop(item, None)
+                else:
+                    inventory[item] = amount
+        elif key != "seq":
+            state[key] = value
+
+class SaveFile:
+    """A snapshot of the player plus an append-only journal of what changed after each turn
+    Saving a turn only appends one line of changes; every compact_every lines they are folded into a new snapshot,
+    so loading never has to replay more than that"""
+    
+    def __init__(self, path, compact_every=256):
+        self.path = path
+        self.journal_path = path + ".journal"
+        self.compact_every = compact_every
+        self.journal = None
+        self.last_state = None
+        self.seq = 0 #Numbers the journal entries, so ones already folded into the snapshot are skipped
+        self.entries = 0
+        
+    def exists(self):
+        return os.path.exists(self.path)
+        
+    def load(self):
+        with open(self.path, encoding="utf-8") as f:
+            snapshot = json.load(f)
+        state = snapshot["player"]
+        self.seq = snapshot["seq"]
+        self.entries = 0
+        torn = False
+        try:
+            with open(self.journal_path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        delta = json.loads(line)
+                    except ValueError: #The last line can be cut off by a crash mid-write
+                        torn = True
+                        break
+                    if delta["seq"] > self.seq:
+                        apply_state_delta(state, delta)
+                        self.seq = delta["seq"]
+                        self.entries += 1
+        except FileNotFoundError:
+            pass
+        player = Player.from_dict(state)
+        if self.entries or torn: #Start from a clean journal rather than appending after a cut off line
+            self.write_snapshot(state)
+        self.last_state = state
+        return player
+        
+    def save(self, player):
+        state = player.to_dict()
+        if self.last_state is None:
+            self.write_snapshot(state)
+            return
+        delta = state_delta(self.last_state, state)
+        if not delta:
+            return
+        self.seq += 1
+        delta["seq"] = self.seq
+        if self.journal is None:
+            self.journal = open(self.journal_path, "a", encoding="utf-8")
+        self.journal.write(json.dumps(delta, separators=(",", ":")) + "\n")
+        self.journal.flush()
+        self.last_state = state
+        self.entries += 1
+        if self.entries >= self.compact_every:
+            self.write_snapshot(state)
+            
+    def write_snapshot(self, state):
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump({"seq": self.seq, "player": state}, f, separators=(",", ":"))
+        os.replace(temp_path, self.path)
+        self.close()
+        open(self.journal_path, "w").close()
+        self.last_state = state
+        self.entries = 0
+        
+    def close(self):
+        if self.journal is not None:
+            self.journal.close()
+            self.journal = None
+        
+    def delete(self):
+        self.close()
+        for path in (self.path, self.journal_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+class Session:
+    "One player's game, with every prompt answered by a policy instead of the keyboard"
+
+    def __init__(self, policy, player=None, quiet=False, seed=None, save_file=None, screen=None, locale=None):
+        self.policy = policy
+        self.player = player if player is not None else Player()
+        self.quiet = quiet
+        if screen is None:
+            screen = NullScreen() if quiet else Screen(color=True)
+        self.screen = screen #Flushed before every prompt
+        self.save_file = save_file #Autosaved to after every turn
+        self.rng = RNG(seed)
+        self.catalog = get_catalog(locale)
+        self.turns = 0
+        self.game_over = None
+
+    @contextlib.contextmanager
+    def active(self):
+        "Points the game's RNG, screen and translations at this session for the duration of the with block"
+        global rng, screen, catalog
+        previous_rng, rng = rng, self.rng
+        previous_screen, screen = screen, self.screen
+        previous_catalog, catalog = catalog, self.catalog
+        try:
+            yield
+        finally:
+            rng = previous_rng
+            screen = previous_screen
+            catalog = previous_catalog
+
+    def run(self, game):
+        "Drives a game generator to the end, answering each prompt it yields with the policy"
+        with self.active():
+            answer = None
+            try:
+                while True:
+                    prompt = game.send(answer)
+                    self.screen.flush()
+                    answer = prompt.ask(self.policy)
+            except StopIteration as e:
+                return e.value
+            finally:
+                self.screen.flush()
+
+    async def run_async(self, game, ask):
+        """Like run, but awaits each answer from ask(prompt), so many sessions can take turns on one event loop
+        The game only runs between prompts, so the session's RNG and output are swapped in just for those steps"""
+        answer = None
+        while True:
+            with self.active():
+                try:
+                    prompt = game.send(answer)
+                except StopIteration as e:
+                    return e.value
+            answer = await ask(prompt)
+
+    @contextlib.contextmanager
+    def saving(self):
+        "Autosaves after the with block, or deletes the save if the player died in it"
+        try:
+            yield
+        except GameOver:
+            if self.save_file:
+                self.save_file.delete()
+            raise
+        if self.save_file:
+            self.save_file.save(self.player)
+
+    def turn(self):
+        self.turns += 1
+        with self.saving():
+            self.run(play_turn(self.player))
+
+    async def turn_async(self, ask):
+        self.turns += 1
+        with self.saving():
+            await self.run_async(play_turn(self.player), ask)
+
+    def explore(self):
+        self.run(explore(self.player))
+
+    def mine(self):
+        self.run(mine(self.player))
+
+    def craft(self):
+        self.run(craft(self.player))
+
+    def craft_chain(self, item):
+        with self.active():
+            try:
+                return craft_chain(self.player, item)
+            finally:
+                self.screen.flush()
+
+    def battle(self, action_verb, mob_type=None):
+        "Fights a battle as if it came up while doing action_verb, exploring or mining, with that action's explosion loot"
+        self.run(random_battle(self.player, action_verb, get_content().explosion_loot.get(action_verb), mob_type))
+
+    def play(self, max_turns=None):
+        "Plays turns until the player dies or max_turns have been played; returns the number of turns played"
+        try:
+            while max_turns is None or self.turns < max_turns:
+                self.turn()
+        except GameOver as e:
+            self.game_over = e
+        return self.turns
+
+RECORDING_VERSION = 1
+
+class Recording:
+    """A game that can be played again exactly: its seed, its locale, the player it started from (None for a new one) and every answer given
+    Kept with the player's state at the end, which a replay has to arrive at"""
+    
+    def __init__(self, seed, locale, answers, start=None, final=None):
+        self.seed = seed
+        self.locale = locale
+        self.answers = answers
+        self.start = start
+        self.final = final
+        self.rng = "numpy" if get_numpy() is not None else "random" #The two give different numbers for the same seed
+        
+    def save(self, path):
+        data = {
+            "version": RECORDING_VERSION,
+            "seed": self.seed,
+            "locale": self.locale,
+            "rng": self.rng,
+            "start": self.start,
+            "answers": self.answers,
+            "final": self.final,
+        }
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+            
+    @staticmethod
+    def load(path):
+        with open(path, encoding="utf-8") as f:
+            d = JSONDict(json.load(f))
+        if d.gettype("version", int) != RECORDING_VERSION:
+            raise JSONError(f"unsupported recording version {d['version']!r}")
+        start = d.get("start")
+        if start is not None and not isinstance(start, dict):
+            raise JSONError("start must be a saved player or null", d)
+        recording = Recording(d.gettype("seed", int), d.gettype("locale", str), d.gettype("answers", list), start, d.gettype("final", dict))
+        recording.rng = d.gettype("rng", str)
+        return recording
+        
+    def replay(self):
+        "Plays the recorded answers back headlessly and returns the session they leave behind"
+        if self.rng != ("numpy" if get_numpy() is not None else "random"):
+            raise ValueError(f"recorded with the {self.rng} RNG, which isn't the one in use here")
+        player = Player.from_dict(self.start) if self.start is not None else None
+        session = Session(ScriptedPolicy(self.answers), player=player, quiet=True, seed=self.seed, locale=self.locale)
+        with session.active():
+            print_title() #Draws from the RNG just as it did when the game was recorded
+        try:
+            session.play()
+        except EOFError: #Where the player stopped, if they didn't die
+            pass
+        return session
+        
+    def verify(self):
+        "Replays the game; returns whether it ended in the recorded state, and the session"
+        session = self.replay()
+        return session.player.to_dict() == self.final, session
+
+def replay_recordings(paths, repeat=1):
+    "Replays each recording repeat times, printing how long it took and whether it matched; returns whether they all did"
+    all_match = True
+    for path in paths:
+        recording = Recording.load(path)
+        start = time.perf_counter()
+        for i in range(repeat):
+            match, session = recording.verify()
+        elapsed = (time.perf_counter() - start) / repeat
+        all_match = all_match and match
+        print(f"{path}: {session.turns} turns, {len(recording.answers)} answers in {elapsed:.4f}s - {'OK' if match else 'MISMATCH'}")
+    return all_match
+
+class BatchError(Exception):
+    "A batch script that is malformed, or that stopped fitting the game in strict mode"
+
+#What each batch command picks from the main menu, or from a battle's menu, where Flee and Ignore are both the second choice
+batch_turn_commands = {"explore": "Explore", "inventory": "Inventory", "craft": "Craft", "switch": "Switch Weapon", "mine": "Mine"}
+batch_battle_commands = {"attack": 1, "flee": 2}
+
+def parse_batch_script(lines):
+    """Checks a batch script, one command per line with # starting a comment, and returns it as (line number, command, argument) tuples
+    Raises BatchError listing every bad line, so a script is never half run"""
+    content = get_content()
+    tools = {name for name, recipe in content.recipes.items() if recipe.tool_data is not None}
+    commands = []
+    errors = []
+    for number, line in enumerate(lines, 1):
+        line = line.split("#", 1)[0].strip()
+        if not line:
+            continue
+        command, sep, argument = line.partition(" ")
+        command = command.lower()
+        argument = argument.strip()
+        if command in ("craft", "switch"):
+            if not argument:
+                errors.append(f"line {number}: {command} needs an item name")
+            elif command == "craft" and argument not in content.recipes:
+                errors.append(f"line {number}: there is no recipe for {argument!r}")
+            elif command == "switch" and argument.lower() != "unarmed" and argument not in tools:
+                errors.append(f"line {number}: {argument!r} isn't a tool")
+        elif command in batch_turn_commands or command in batch_battle_commands:
+            if argument:
+                errors.append(f"line {number}: {command} doesn't take an argument")
         else:
-            print(_("Items you can craft:"))
-            for item in craftable:
-                name, info = item
-                quantity = info.quantity
-                string = f"{quantity}x {name} |  " + _("Components: ")
-                components = info.components
-                string += ", ".join(f"{c[1]}x {c[0]}" for c in components)
-                print(string)
-                print()     
-            print(_("What would you like to craft?"))
-            item_name = input()
-            item = next((v for v in craftable if v[0] == item_name), None)
-            if item is not None:
-                name, info = item
-                components = info.components
-                quantity = info.quantity
-                for component in components:
-                    player.remove_item(*component)
-                if info.tool_data is not None:
-                    tool_data = info.tool_data
-                    damage = tool_data.damage
-                    durability = tool_data.durability
-                    mining_mult = tool_data.mining_mult
-                    attack_speed = tool_data.attack_speed
-                    player.add_tool(Tool(name, damage, durability, mining_mult, attack_speed))
+            errors.append(f"line {number}: unknown command {command!r}")
+        commands.append((number, command, argument))
+    if errors:
+        raise BatchError("\n".join(errors))
+    return commands
+
+class BatchPolicy:
+    """Answers prompts from a parsed batch script
+    Battles that the script has no attack or flee for are fled from, and commands that don't fit are reported as failures and skipped,
+    or raise BatchError if strict"""
+    
+    def __init__(self, commands, player, strict=False):
+        self.commands = commands
+        self.index = 0
+        self.player = player
+        self.strict = strict
+        self.failures = []
+        self.argument = None #Of the craft or switch command being carried out, until its prompt takes it
+        self.crafting = None #(line number, item, how many there were) for the craft command being carried out
+        
+    def peek(self):
+        return self.commands[self.index] if self.index < len(self.commands) else None
+        
+    def take(self):
+        command = self.peek()
+        if command is None:
+            raise EOFError("end of batch script") #Like input() at the end of its input
+        self.index += 1
+        screen.print(f"> {command[1]} {command[2]}".rstrip())
+        return command
+        
+    def fail(self, number, message):
+        message = f"line {number}: {message}"
+        if self.strict:
+            raise BatchError(message)
+        self.failures.append(message)
+        
+    def count(self, item):
+        return self.player.count_item(item) + len(self.player.tools_by_type.get(item, ()))
+        
+    def choose(self, prompt):
+        choices = prompt.choices
+        if "Explore" in choices:
+            while True:
+                number, command, argument = self.take()
+                option = batch_turn_commands.get(command)
+                if option is None:
+                    self.fail(number, f"{command} is for battles, but there is no battle")
+                elif option not in choices:
+                    self.fail(number, f"can't {command} now")
+                elif command == "mine" and not (self.player.curr_weapon and self.player.curr_weapon.name in get_content().mining_loot):
+                    self.fail(number, "can't mine without holding a pickaxe")
                 else:
-                    player.add_item(name, quantity)
-                print(_("You have crafted {0}x {1}").format(quantity,name))
-            else:
-                print(_("Invalid item"))
-    elif choice == _("Switch Weapon"):
-        player.switch_weapon_menu()
-    elif choice == _("Mine"):
-        if player.curr_weapon and "Pickaxe" in player.curr_weapon.name:
-            tiers = ["Wooden Pickaxe", "Stone Pickaxe", "Iron Pickaxe"]
-            tier_num = tiers.index(player.curr_weapon.name) + 1
-            minables = WeightedList()
-            minables.add(_("Stone"), 1500)
-            minables.add(_("Coal"), 124)
-            if tier_num > 1:
-                minables.add(_("Raw Iron"), 72)
-                minables.add(_("Lapis Lazuli"), 3)
-                if tier_num > 2:
-                    minables.add(_("Raw Gold"), 7)
-                    minables.add(_("Diamond"), 3)
-            found = minables.pick()
-            if found == _("Coal"):
-                exp_gain = random.randint(0, 2)
-            elif found == _("Lapis Lazuli"):
-                exp_gain = random.randint(2, 5)
-            elif found == _("Diamond"):
-                exp_gain = random.randint(3, 7)
-            else:
-                exp_gain = 0
-            if found == _("Lapis Lazuli"):
-                quantity = random.randint(4, 9)
-            else:
-                quantity = 1
-            print(_("Mining..."))
-            #time.sleep(random.uniform(0.75, 1.5))
-            mine_mult = player.curr_weapon.mining_mult
-            mob_chance = 10# day chance 10, night 15
-            mob_chance *= math.sqrt(mine_mult)
-            mob_chance = round(mob_chance)
-            if found == _("Stone") and one_in(3):
-                print(_("You didn't find much of value"))
-                player.advance_time(3)
+                    self.argument = argument
+                    if command == "craft":
+                        self.crafting = (number, argument, self.count(argument))
+                    return choices.index(option) + 1
+        if "Attack" in choices:
+            command = self.peek()
+            if command is None or command[1] not in batch_battle_commands:
+                screen.print("> flee (the script has no command for this battle)")
+                return batch_battle_commands["flee"]
+            return batch_battle_commands[self.take()[1]]
+        if "Unarmed" in choices:
+            argument, self.argument = self.argument, None
+            if argument.lower() == "unarmed":
+                return len(choices)
+            if argument in choices[:-1]:
+                return choices.index(argument) + 1
+            self.fail(self.commands[self.index - 1][0], f"you don't have a {argument}")
+            weapon = self.player.curr_weapon
+            return self.player.tools.index(weapon) + 1 if weapon else len(choices)
+        raise BatchError(f"batch mode can't answer a menu of {', '.join(choices)}")
+        
+    def yes_no(self, prompt):
+        if prompt.message == "Would you like to switch weapons?":
+            command = self.peek()
+            if command is not None and command[1] == "switch":
+                self.argument = self.take()[2]
+                return True
+            return False
+        return True #Craft all of them: the script asked for the item, so make whatever goes into it too
+        
+    def text(self, prompt):
+        argument, self.argument = self.argument, None
+        return argument
+        
+    def check_craft(self):
+        "Reports the craft command of the turn just played as a failure if it didn't make anything"
+        if self.crafting is not None:
+            number, item, before = self.crafting
+            self.crafting = None
+            self.argument = None
+            if self.count(item) <= before:
+                self.fail(number, f"couldn't craft {item}")
+
+def run_batch(commands, seed=None, screen=None, locale=None, strict=False):
+    "Plays a parsed batch script through to its end or the player's death; returns the session and the policy with its failures"
+    session = Session(None, seed=seed, screen=screen, quiet=screen is None, locale=locale)
+    policy = session.policy = BatchPolicy(commands, session.player, strict)
+    try:
+        while policy.peek() is not None:
+            try:
+                session.turn()
+            finally:
+                policy.check_craft()
+    except GameOver as e:
+        session.game_over = e
+    except EOFError: #The script ran out partway through a turn
+        pass
+    return session, policy
+
+def batch(paths, runs=1, seed=None, quiet=False, locale=None, strict=False):
+    """Runs batch scripts, from files or - for stdin, runs times each with seeds counting up from seed
+    Prints a summary of every run, and any failures to stderr; returns whether there were none"""
+    lines = []
+    for path in paths:
+        if path == "-":
+            lines.extend(sys.stdin.read().splitlines())
+        else:
+            with open(path, encoding="utf-8") as f:
+                lines.extend(f.read().splitlines())
+    try:
+        commands = parse_batch_script(lines)
+    except BatchError as e:
+        print(e, file=sys.stderr)
+        return False
+    if seed is None:
+        seed = random.SystemRandom().getrandbits(32)
+    ok = True
+    out = Screen(sink=sys.stdout)
+    for run in range(runs):
+        try:
+            session, policy = run_batch(commands, seed + run, None if quiet else out, locale, strict)
+        except BatchError as e:
+            out.flush()
+            print(f"Run {run + 1} (seed {seed + run}): {e}", file=sys.stderr)
+            ok = False
+            continue
+        player = session.player
+        state = "died" if session.game_over else f"alive with {player.HP}/20 HP"
+        out.print(f"Run {run + 1} (seed {seed + run}): {session.turns} turns, {state}, level {player.level}, {len(policy.failures)} failures")
+        out.flush()
+        for failure in policy.failures:
+            print(f"Run {run + 1}: {failure}", file=sys.stderr)
+        ok = ok and not policy.failures
+    return ok
+
+def init_simulate_worker(with_metrics):
+    "Sets up a simulate worker process; its metrics, if on, are kept in memory and handed back by simulate_run for the parent to merge"
+    Mob.enable_pool()
+    if with_metrics:
+        worker_metrics = enable_metrics() #A forked worker already has the parent's, which are the parent's to write
+        worker_metrics.path = None
+        worker_metrics.take()
+
+def simulate_run(seed, max_turns):
+    "Plays one seeded headless game with random decisions and returns its statistics"
+    session = Session(RandomPolicy(), quiet=True, seed=seed)
+    session.play(max_turns)
+    player = session.player
+    return {
+        "metrics": metrics.take() if metrics is not None else None,
+        "turns": session.turns,
+        "died": session.game_over is not None,
+        "killer": session.game_over.killer if session.game_over else None,
+        "survival_time": player.time.elapsed,
+        "exp": player.EXP,
+        "level": player.level,
+        "tools_broken": dict(player.tools_broken),
+    }
+
+def simulate(runs, max_turns, seed=0, workers=None):
+    """Plays many independent games across a process pool and merges their statistics
+    Every run gets its own seed derived from the master seed, so the report is the same for a given seed no matter how many workers are used"""
+    from concurrent.futures import ProcessPoolExecutor #Pulls in multiprocessing, which is slow to import, so only when needed
+    master = random.Random(seed)
+    seeds = [master.getrandbits(64) for i in range(runs)]
+    workers = workers or os.cpu_count() or 1
+    chunksize = max(1, runs // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_simulate_worker, initargs=(metrics is not None,)) as executor:
+        results = list(executor.map(simulate_run, seeds, [max_turns] * runs, chunksize=chunksize))
+    report = {
+        "runs": runs,
+        "deaths": 0,
+        "turns": 0,
+        "survival_time": 0,
+        "exp": 0,
+        "deaths_by_mob": Counter(),
+        "tools_broken": Counter(),
+    }
+    for result in results:
+        if result["metrics"] is not None:
+            metrics.merge(result["metrics"])
+        report["turns"] += result["turns"]
+        report["survival_time"] += result["survival_time"]
+        report["exp"] += result["exp"]
+        if result["died"]:
+            report["deaths"] += 1
+            report["deaths_by_mob"][result["killer"] or "Other"] += 1
+        report["tools_broken"].update(result["tools_broken"])
+    hours = report["survival_time"] / 3600
+    report["mean_survival_time"] = report["survival_time"] / runs if runs else 0
+    report["exp_per_hour"] = report["exp"] / hours if hours else 0
+    return report
+
+def print_simulation_report(report):
+    print(f"Runs: {report['runs']}")
+    print(f"Deaths: {report['deaths']}")
+    print(f"Turns played: {report['turns']}")
+    print(f"Mean survival time: {report['mean_survival_time']:.1f}s")
+    print(f"EXP/hour: {report['exp_per_hour']:.2f}")
+    print("Deaths by mob:")
+    for mob, count in sorted(report["deaths_by_mob"].items(), key=lambda item: (-item[1], item[0])):
+        print(f"  {count}x {mob}")
+    print("Tools broken:")
+    for tool, count in sorted(report["tools_broken"].items(), key=lambda item: (-item[1], item[0])):
+        print(f"  {count}x {tool}")
+
+class ActionStats:
+    __slots__ = ("count", "seconds", "buckets", "draws", "prompts", "errors")
+    
+    def __init__(self, buckets):
+        self.count = 0
+        self.seconds = 0
+        self.buckets = [0] * (buckets + 1) #The last one is for anything above the largest bucket
+        self.draws = 0
+        self.prompts = 0
+        self.errors = 0
+
+class Metrics:
+    """Counts, latency histograms and RNG draws for the game's actions, written to path every interval seconds, as Prometheus text or JSON
+    Latency only counts the time the game spends running, not waiting for answers, and includes any actions nested inside
+    {pid} in the path is replaced with the process ID, so prefork workers can each have their own file"""
+    
+    buckets = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1) #Upper bounds, in seconds
+    
+    def __init__(self, path=None, format="prometheus", interval=10):
+        self.path = path
+        self.format = format
+        self.interval = interval
+        self.next_write = time.monotonic() + interval
+        self.actions = {}
+        
+    def observe(self, action, seconds, draws=0, prompts=0, error=False):
+        stats = self.actions.get(action)
+        if stats is None:
+            stats = self.actions[action] = ActionStats(len(self.buckets))
+        stats.count += 1
+        stats.seconds += seconds
+        stats.buckets[bisect.bisect_left(self.buckets, seconds)] += 1
+        stats.draws += draws
+        stats.prompts += prompts
+        stats.errors += error
+        if self.path and time.monotonic() >= self.next_write:
+            self.write()
+            
+    def timed(self, action, func):
+        "Wraps a function so that each call is observed as action"
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            error = True
+            start_draws = rng.draws()
+            start = time.perf_counter()
+            try:
+                value = func(*args, **kwargs)
+                error = False
+                return value
+            finally:
+                self.observe(action, time.perf_counter() - start, rng.draws() - start_draws, 0, error)
+        return wrapper
+        
+    def timed_game(self, action, func):
+        "Wraps a game generator function so that each game it makes is observed as action, timing only the steps between its prompts"
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            game = func(*args, **kwargs)
+            seconds = 0
+            draws = 0
+            prompts = 0
+            error = True
+            answer = None
+            try:
+                while True:
+                    start_draws = rng.draws()
+                    start = time.perf_counter()
+                    try:
+                        prompt = game.send(answer)
+                    finally:
+                        seconds += time.perf_counter() - start
+                        draws += rng.draws() - start_draws
+                    prompts += 1
+                    answer = yield prompt
+            except StopIteration as e:
+                error = False
+                return e.value
+            except GeneratorExit: #Abandoned at a prompt, e.g. by a client disconnecting
+                error = False
+                raise
+            finally:
+                self.observe(action, seconds, draws, prompts, error)
+        return wrapper
+        
+    def to_dict(self):
+        actions = {}
+        for action, stats in list(self.actions.items()):
+            cumulative = 0
+            buckets = {}
+            for bound, count in zip(self.buckets + (float("inf"),), stats.buckets):
+                cumulative += count
+                buckets[repr(bound) if bound != float("inf") else "+Inf"] = cumulative
+            actions[action] = {
+                "count": stats.count,
+                "seconds": stats.seconds,
+                "buckets": buckets,
+                "rng_draws": stats.draws,
+                "prompts": stats.prompts,
+                "errors": stats.errors,
+            }
+        return {"time": time.time(), "pid": os.getpid(), "actions": actions}
+        
+    def take(self):
+        "Returns the metrics as to_dict does and starts again from zero, for handing them to another process to merge"
+        data = self.to_dict()
+        self.actions = {}
+        return data
+        
+    def merge(self, data):
+        "Adds in metrics from another process, in the form to_dict returns"
+        for action, other in data["actions"].items():
+            stats = self.actions.get(action)
+            if stats is None:
+                stats = self.actions[action] = ActionStats(len(self.buckets))
+            stats.count += other["count"]
+            stats.seconds += other["seconds"]
+            stats.draws += other["rng_draws"]
+            stats.prompts += other["prompts"]
+            stats.errors += other["errors"]
+            previous = 0
+            for i, cumulative in enumerate(other["buckets"].values()): #Cumulative, like Prometheus buckets
+                stats.buckets[i] += cumulative - previous
+                previous = cumulative
+        
+    def prometheus(self):
+        actions = self.to_dict()["actions"]
+        lines = [
+            "# HELP starcraft_action_seconds Time spent running each game action, not counting waiting for answers",
+            "# TYPE starcraft_action_seconds histogram",
+        ]
+        for action, stats in actions.items():
+            for bound, count in stats["buckets"].items():
+                lines.append(f'starcraft_action_seconds_bucket{{action="{action}",le="{bound}"}} {count}')
+            lines.append(f'starcraft_action_seconds_sum{{action="{action}"}} {stats["seconds"]!r}')
+            lines.append(f'starcraft_action_seconds_count{{action="{action}"}} {stats["count"]}')
+        for name, key, help in (
+            ("starcraft_action_rng_draws_total", "rng_draws", "Random numbers drawn by each game action"),
+            ("starcraft_action_prompts_total", "prompts", "Prompts shown by each game action, e.g. one per turn of a battle"),
+            ("starcraft_action_errors_total", "errors", "Game actions ended by an exception, such as the player dying"),
+        ):
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} counter")
+            for action, stats in actions.items():
+                lines.append(f'{name}{{action="{action}"}} {stats[key]}')
+        return "\n".join(lines) + "\n"
+        
+    def write(self):
+        "Writes the metrics out now; the file is replaced in one go, so a scraper never reads half of it"
+        self.next_write = time.monotonic() + self.interval
+        if not self.path:
+            return
+        path = self.path.replace("{pid}", str(os.getpid()))
+        text = self.prometheus() if self.format == "prometheus" else json.dumps(self.to_dict(), indent=2)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(temp_path, path)
+        except OSError as e:
+            print(f"Couldn't write metrics to {path}: {e}", file=sys.stderr)
+
+metrics = None #Only set once instrumentation is turned on
+
+def enable_metrics(path=None, format="prometheus", interval=10):
+    """Turns on instrumentation of the main actions, battles, mob deaths and content loading, returning the Metrics
+    The instrumented functions are only wrapped from here on, so until this is called they run exactly as written"""
+    global metrics, explore, mine, craft, random_battle, load_content
+    if metrics is not None:
+        return metrics
+    metrics = Metrics(path, format, interval)
+    explore = metrics.timed_game("explore", explore)
+    mine = metrics.timed_game("mine", mine)
+    craft = metrics.timed_game("craft", craft)
+    random_battle = metrics.timed_game("battle", random_battle)
+    Player.switch_weapon_menu = metrics.timed_game("switch_weapon", Player.switch_weapon_menu)
+    Mob.on_death = metrics.timed("mob_death", Mob.on_death)
+    load_content = metrics.timed("load_content", load_content)
+    atexit.register(metrics.write)
+    return metrics
+
+splashes = None
+
+def get_splashes():
+    global splashes
+    if splashes is None:
+        with open(os.path.join(DATA_DIR, "splashes.txt"), encoding="utf-8") as f:
+            splashes = tuple(f.read().splitlines())
+    return splashes
+
+def print_title():
+    screen.print("""
+   _____ _______       _____   _____ _____            ______ _______ 
+  / ____|__   __|/\\   |  __ \\ / ____|  __ \\     /\\   |  ____|__   __|
+ | (___    | |  /  \\  | |__) | |    | |__) |   /  \\  | |__     | |   
+  \\___ \\   | | / /\\ \\ |  _  /| |    |  _  /   / /\\ \\ |  __|    | |   
+  ____) |  | |/ ____ \\| | \\ \\| |____| | \\ \\  / ____ \\| |       | |   
+ |_____/   |_/_/    \\_\\_|  \\_\\______|_|  \\_\\/_/    \\_\\_|       |_|   
+""")
+    screen.print()
+    screen.print()
+    screen.cprint(rng.choice(get_splashes()), "yellow", attrs=["bold"])
+    screen.print()
+
+def play(save_file=None, locale=None, seed=None, record=None):
+    "Plays in the terminal; if record is a path, the game is written there as a Recording when it ends"
+    policy = TerminalPolicy()
+    if record is not None:
+        policy = RecordingPolicy(policy)
+        if seed is None:
+            seed = random.SystemRandom().getrandbits(64)
+    session = Session(policy, save_file=save_file, locale=locale, seed=seed)
+    with session.active():
+        print_title()
+        screen.flush()
+        choice = choice_input(_("Play"), _("Quit"))
+        if choice == 2:
+            exit()
+
+        if save_file and save_file.exists():
+            session.player = save_file.load()
+            screen.print(_("Your saved game has been loaded."))
+    start = session.player.to_dict() if record is not None and save_file and save_file.last_state is not None else None #A new player needs no saving
+    try:
+        session.play()
+    finally: #Also when the player stops with Ctrl+C or the end of input, so that can be replayed too
+        if record is not None:
+            Recording(seed, session.catalog.locale, policy.answers, start, session.player.to_dict()).save(record)
+    exit()
+
+async def play_remote(session, reader, writer, idle_timeout=None, locales=()):
+    """Plays a session over a connection: the game's text is sent to the writer once per prompt, and answers are read a line at a time
+    If there are several locales, the player picks one of them first"""
+    import asyncio #Slow to import, and only needed for serving
+    async def send(text):
+        writer.write((session.screen.take() + text).encode("utf-8"))
+        await writer.drain()
+    async def ask(prompt):
+        with session.active():
+            text = prompt.render()
+        while True:
+            await send(text)
+            line = await asyncio.wait_for(reader.readline(), idle_timeout)
+            if not line:
+                raise ConnectionResetError("client disconnected")
+            with session.active():
+                answer = prompt.parse(line.decode("utf-8", "replace").strip())
+            if answer is not None:
+                return answer
+            text = prompt.reprompt
+    if len(locales) > 1:
+        session.catalog = get_catalog(await ask(Choice(*locales, return_text=True, labels=locales)))
+    with session.active():
+        print_title()
+    if await ask(Choice(N_("Play"), N_("Quit"))) == 1:
+        try:
+            while True:
+                await session.turn_async(ask)
+        except GameOver as e:
+            session.game_over = e
+    await send("")
+
+async def serve(host="127.0.0.1", port=2323, max_sessions=10000, idle_timeout=None, line_limit=1024, sock=None, locales=None):
+    """Hosts a game for every client that connects, all on one event loop and sharing the loaded content and translations
+    Each session only holds its player, its RNG and the text waiting to be sent, and lines longer than line_limit drop the client
+    Players choose from locales if there are several, with the first one as the default
+    Listens on sock instead of host and port if it is given"""
+    import asyncio
+    locales = locales or [DEFAULT_LOCALE]
+    for locale in locales: #Fails now rather than when a player picks a missing one
+        get_catalog(locale)
+    sessions = set()
+    async def handle(reader, writer):
+        if len(sessions) >= max_sessions:
+            writer.write(_("The server is full, try again later.\n").encode("utf-8"))
+            writer.close()
+            return
+        session = Session(None, screen=Screen(), locale=locales[0])
+        sessions.add(session)
+        try:
+            await play_remote(session, reader, writer, idle_timeout, locales)
+        except (ConnectionError, asyncio.TimeoutError, ValueError): #ValueError is a line over the limit
+            pass
+        finally:
+            sessions.discard(session)
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+    if sock is not None:
+        server = await asyncio.start_server(handle, sock=sock, limit=line_limit)
+    else:
+        server = await asyncio.start_server(handle, host, port, limit=line_limit)
+        print(f"Serving on {', '.join(str(sock.getsockname()) for sock in server.sockets)}")
+    async with server:
+        await server.serve_forever()
+
+def prefork(host="127.0.0.1", port=2323, workers=None, max_sessions=10000, idle_timeout=None, locales=None):
+    """Loads and freezes everything once, then forks workers that all serve games from the same listening socket
+    Workers share the parent's content through copy-on-write, and one that exits is replaced by a fresh fork without reloading anything"""
+    import asyncio, socket, signal, gc
+    workers = workers or os.cpu_count() or 1
+    get_content().freeze()
+    locales = locales or [DEFAULT_LOCALE]
+    for locale in locales:
+        get_catalog(locale)
+    get_splashes()
+    sock = socket.create_server((host, port), backlog=1024)
+    sock.setblocking(False)
+    gc.freeze() #Keeps the collector from writing to every shared object in the workers, which would copy their pages
+    children = {}
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            if metrics is not None:
+                metrics.take() #What the parent counted before forking is in its own file
+                def stop(signum, frame):
+                    metrics.write()
+                    os._exit(0)
+                signal.signal(signal.SIGTERM, stop)
             else:
-                print(_("You found")+f"{quantity}x {found}")
-                player.gain_exp(exp_gain)
-                player.add_item(found, quantity)
-                #player.mod_food_exhaustion(0.005)
-                if found == _("Stone"):
-                    base_mine_time = 1.5
-                else:
-                    base_mine_time = 3
-                mine_time = round(base_mine_time / mining_mult, 2)
-                player.advance_time(mine_time)
-                player.decrement_tool_durability()
-            if one_in(mob_chance):
-                random_battle(player, True, _("mining"))
+                signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            status = 0
+            try:
+                asyncio.run(serve(max_sessions=max_sessions, idle_timeout=idle_timeout, sock=sock, locales=locales))
+            except KeyboardInterrupt:
+                pass
+            except BaseException:
+                traceback.print_exc()
+                status = 1
+            finally:
+                if metrics is not None: #atexit handlers don't run on os._exit
+                    metrics.write()
+                os._exit(status) #Never fall back into the parent's code
+        children[pid] = time.monotonic()
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit()) #So the workers get stopped too
+    for i in range(workers):
+        spawn()
+    print(f"Serving on {sock.getsockname()} with {workers} workers")
+    try:
+        while True:
+            pid, status = os.wait()
+            started = children.pop(pid, None)
+            if started is None:
+                continue
+            print(f"Worker {pid} exited, starting a new one")
+            if time.monotonic() - started < 1: #Don't spin if workers are dying straight away
+                time.sleep(1)
+            spawn()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        sock.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="A text-based RPG game based on Minecraft")
+    locales = available_locales()
+    modes = parser.add_subparsers(dest="mode")
+    sim = modes.add_parser("simulate", help="play many random games headlessly and report balance statistics")
+    sim.add_argument("-n", "--runs", type=int, default=1000, help="number of games to play")
+    sim.add_argument("-t", "--turns", type=int, default=1000, help="maximum turns per game")
+    sim.add_argument("-s", "--seed", type=int, default=0, help="master seed")
+    sim.add_argument("-w", "--workers", type=int, default=None, help="worker processes (default: one per core)")
+    sim.add_argument("--json", action="store_true", help="print the report as JSON")
+    srv = modes.add_parser("serve", help="host games for many players over TCP (connect with telnet or nc)")
+    srv.add_argument("--host", default="127.0.0.1", help="address to listen on (default: %(default)s)")
+    srv.add_argument("-p", "--port", type=int, default=2323, help="port to listen on (default: %(default)s)")
+    srv.add_argument("--max-sessions", type=int, default=10000, help="most players connected at once (default: %(default)s)")
+    srv.add_argument("--idle-timeout", type=float, default=None, help="seconds to wait for a player's answer before disconnecting them")
+    srv.add_argument("--lang", dest="locales", action="append", choices=locales, help="language players can choose; repeat to offer several, the first being the default (default: %s)" % DEFAULT_LOCALE)
+    pre = modes.add_parser("prefork", help="like serve, but across several forked worker processes sharing one copy of the content")
+    pre.add_argument("--host", default="127.0.0.1", help="address to listen on (default: %(default)s)")
+    pre.add_argument("-p", "--port", type=int, default=2323, help="port to listen on (default: %(default)s)")
+    pre.add_argument("-w", "--workers", type=int, default=None, help="worker processes (default: one per core)")
+    pre.add_argument("--max-sessions", type=int, default=10000, help="most players connected at once per worker (default: %(default)s)")
+    pre.add_argument("--idle-timeout", type=float, default=None, help="seconds to wait for a player's answer before disconnecting them")
+    pre.add_argument("--lang", dest="locales", action="append", choices=locales, help="language players can choose; repeat to offer several, the first being the default (default: %s)" % DEFAULT_LOCALE)
+    bat = modes.add_parser("batch", help="play scripted commands (explore, mine, inventory, craft ITEM, switch TOOL, attack, flee) from files or stdin")
+    bat.add_argument("scripts", nargs="*", default=["-"], help="script files, one command per line; - for stdin (the default)")
+    bat.add_argument("-n", "--runs", type=int, default=1, help="times to play the script, with seeds counting up (default: %(default)s)")
+    bat.add_argument("-s", "--seed", dest="batch_seed", type=int, default=None, help="seed of the first run (default: random)")
+    bat.add_argument("-q", "--quiet", action="store_true", help="only print the summary of each run")
+    bat.add_argument("--strict", action="store_true", help="stop a run at the first command that doesn't fit the game")
+    rep = modes.add_parser("replay", help="replay recorded games headlessly, checking they end the same way and timing them")
+    rep.add_argument("recordings", nargs="+", help="files written by --record")
+    rep.add_argument("-r", "--repeat", type=int, default=1, help="times to replay each one, for timing (default: %(default)s)")
+    parser.add_argument("--save", default="save.json", help="file to autosave the game to and resume it from (default: %(default)s)")
+    parser.add_argument("--no-save", action="store_true", help="don't load or autosave a game")
+    parser.add_argument("--lang", default=DEFAULT_LOCALE, choices=locales, help="language to play in (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=None, help="seed for the game's random numbers")
+    parser.add_argument("--record", metavar="FILE", default=None, help="record the seed and every answer to FILE, for the replay command")
+    parser.add_argument("--metrics", metavar="FILE", default=None, help="instrument the game and write its metrics to FILE; {pid} in it is replaced with the process ID")
+    parser.add_argument("--metrics-format", choices=["prometheus", "json"], default="prometheus", help="format of the metrics file (default: %(default)s)")
+    parser.add_argument("--metrics-interval", type=float, default=10, help="seconds between writes of the metrics file (default: %(default)s)")
+    args = parser.parse_args(argv)
+    if args.metrics:
+        enable_metrics(args.metrics, args.metrics_format, args.metrics_interval)
+    if args.mode == "simulate":
+        report = simulate(args.runs, args.turns, args.seed, args.workers)
+        if args.json:
+            print(json.dumps(report, indent=2, sort_keys=True))
         else:
-            print(_("You need to switch to your pickaxe to mine"))
\ No newline at end of file
+            print_simulation_report(report)
+    elif args.mode == "serve":
+        import asyncio
+        try:
+            asyncio.run(serve(args.host, args.port, args.max_sessions, args.idle_timeout, locales=args.locales))
+        except KeyboardInterrupt:
+            pass
+    elif args.mode == "prefork":
+        if not hasattr(os, "fork"):
+            parser.error("prefork needs a system with fork(); use serve instead")
+        prefork(args.host, args.port, args.workers, args.max_sessions, args.idle_timeout, args.locales)
+    elif args.mode == "batch":
+        if not batch(args.scripts, args.runs, args.batch_seed, args.quiet, args.lang, args.strict):
+            sys.exit(1)
+    elif args.mode == "replay":
+        if not replay_recordings(args.recordings, args.repeat):
+            sys.exit(1)
+    else:
+        play(None if args.no_save else SaveFile(args.save), args.lang, args.seed, args.record)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+#Tests for the parts of the game that are easy to get subtly wrong; run with python3 -m pytest
+#Random ones are seeded, so they give the same numbers every run
+
+from collections import Counter
+import pytest
+import starcraft
+from starcraft import RNG, WeightedList, Player, SaveFile
+
+@pytest.fixture
+def seeded(monkeypatch):
+    "Points the game's RNG at a fresh seeded one"
+    def seed(value):
+        monkeypatch.setattr(starcraft, "rng", RNG(value))
+    return seed
+
+def weighted_list(weights):
+    weighted = WeightedList()
+    for value, weight in weights.items():
+        weighted.add(value, weight)
+    return weighted
+
+@pytest.mark.parametrize("weights", [
+    {"a": 1},
+    {"a": 1, "b": 1},
+    {"a": 1500, "b": 124, "c": 72, "d": 3},
+    {i: i % 17 + 1 for i in range(100)},
+])
+def test_weighted_list_frequencies(seeded, weights):
+    seeded(1)
+    weighted = weighted_list(weights)
+    total = sum(weights.values())
+    picks = 200000
+    for found in (Counter(weighted.pick() for i in range(picks)), Counter(weighted.pick_many(picks))):
+        assert set(found) <= set(weights)
+        for value, weight in weights.items():
+            assert found[value] / picks == pytest.approx(weight / total, abs=0.005)
+
+def test_weighted_list_skips_zero_weights(seeded):
+    seeded(2)
+    weighted = weighted_list({"a": 0, "b": 3, "c": 0})
+    assert set(weighted.pick_many(1000)) == {"b"}
+
+def test_weighted_list_empty():
+    with pytest.raises(IndexError):
+        WeightedList().pick()
+
+def binomial_pmf(n, p):
+    pmf = [(1 - p) ** n]
+    for k in range(1, n + 1):
+        pmf.append(pmf[-1] * (n - k + 1) / k * p / (1 - p))
+    return pmf
+
+@pytest.mark.parametrize("n, x, y", [
+    (20, 30, 100), #Inversion
+    (10, 1, 3),
+    (40, 90, 100), #Inversion, for 1 - p
+    (60, 50, 100), #BTRS
+    (200, 1, 6),
+])
+def test_binomial_distribution(seeded, n, x, y):
+    seeded(3)
+    samples = 100000
+    found = Counter(starcraft.binomial(n, x, y) for i in range(samples))
+    assert min(found) >= 0 and max(found) <= n
+    for k, p in enumerate(binomial_pmf(n, x / y)):
+        assert found[k] / samples == pytest.approx(p, abs=0.006)
+
+@pytest.mark.parametrize("n, p", [(1000, 0.3), (10 ** 6, 0.01), (10 ** 9, 0.5)])
+def test_binomial_mean_and_variance(seeded, n, p):
+    seeded(4)
+    samples = 20000
+    values = [starcraft.binomial(n, p * 100) for i in range(samples)]
+    mean = sum(values) / samples
+    variance = sum((value - mean) ** 2 for value in values) / (samples - 1)
+    assert mean == pytest.approx(n * p, abs=5 * (n * p * (1 - p) / samples) ** 0.5)
+    assert variance == pytest.approx(n * p * (1 - p), rel=0.05)
+
+def test_binomial_edge_cases(seeded):
+    seeded(5)
+    assert starcraft.binomial(0, 50) == 0
+    assert starcraft.binomial(-3, 50) == 0
+    assert starcraft.binomial(10, 0) == 0
+    assert starcraft.binomial(10, 100) == 10
+    assert starcraft.binomial(10, 1, 1) == 10 #Like one_in(1)
+    assert starcraft.binomial_many([0, 5, 5], 100) == [0, 5, 5]
+
+def play_turns(save_file, player, turns):
+    for i in range(turns):
+        player.add_item("Wood", i + 1)
+        player.add_item("Stone", 2)
+        player.HP -= 1
+        player.advance_time(17)
+        save_file.save(player)
+
+def test_save_file_round_trip(tmp_path):
+    path = str(tmp_path / "save.json")
+    save_file = SaveFile(path, compact_every=4)
+    player = Player()
+    save_file.save(player) #The first save is a snapshot
+    play_turns(save_file, player, 6) #Folded into a new snapshot after 4, leaving 2 in the journal
+    save_file.close()
+    with open(path + ".journal", encoding="utf-8") as f:
+        assert len(f.readlines()) == 2
+    assert SaveFile(path).load().to_dict() == player.to_dict()
+
+def test_save_file_recovers_from_a_torn_line(tmp_path):
+    path = str(tmp_path / "save.json")
+    save_file = SaveFile(path, compact_every=100)
+    player = Player()
+    save_file.save(player)
+    play_turns(save_file, player, 5)
+    save_file.close()
+    with open(path + ".journal", "a", encoding="utf-8") as f:
+        f.write('{"HP":3,"seq":') #A crash partway through writing the next turn
+    save_file = SaveFile(path)
+    loaded = save_file.load()
+    assert loaded.to_dict() == player.to_dict()
+    with open(path + ".journal", encoding="utf-8") as f: #Started over from a snapshot, so nothing is appended after the torn line
+        assert f.read() == ""
+    play_turns(save_file, loaded, 3)
+    save_file.close()
+    assert SaveFile(path).load().to_dict() == loaded.to_dict()
+
+def test_save_file_removed_items(tmp_path):
+    path = str(tmp_path / "save.json")
+    save_file = SaveFile(path)
+    player = Player()
+    player.add_item("Wood", 5)
+    save_file.save(player)
+    player.remove_item("Wood", 5)
+    save_file.save(player)
+    save_file.close()
+    assert "Wood" not in SaveFile(path).load().inventory
+
+def test_level_for_exp_matches_the_loop():
+    level = 0
+    for exp in range(300001): #How levels used to be found, one at a time
+        while starcraft.get_exp_required_for_level(level) <= exp:
+            level += 1
+        assert starcraft.get_level_for_exp(exp) == level
+
+def test_level_for_exp_far_out():
+    for level in (100, 1000, 10 ** 5):
+        required = starcraft.get_exp_required_for_level(level)
+        assert starcraft.get_level_for_exp(required - 1) == level
+        assert starcraft.get_level_for_exp(required) == level + 1